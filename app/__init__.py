@@ -1,6 +1,11 @@
 from flask import Flask
 from app.config import load_configurations, configure_logging
 from .bot.webhooks import webhook_blueprint # Updated import path
+from .bot.adapters.whatsapp_adapter import WhatsAppAdapter
+from .bot.providers.llm_provider import LLMProvider
+from .bot.prompt_builder.whatsapp_prompt_builder import WhatsAppPromptBuilder
+from .bot.assistant import ChatAssistant
+from .bot.serial import KeyedSerialExecutor
 
 
 def create_app():
@@ -10,6 +15,21 @@ def create_app():
     load_configurations(app)
     configure_logging()
 
+    # Create the bot's long-lived services once per app instead of per message,
+    # so config is read once and HTTP connection pools are actually reused.
+    with app.app_context():
+        # Webhook messages run here, in arrival order per user (see dispatch_whatsapp_message)
+        app.extensions["message_executor"] = KeyedSerialExecutor(
+            max_workers=app.config["WEBHOOK_WORKER_THREADS"],
+            thread_name_prefix="whatsapp-worker",
+            app=app,
+        )
+        app.extensions["whatsapp_adapter"] = WhatsAppAdapter()
+        app.extensions["llm_provider"] = LLMProvider()
+        app.extensions["prompt_builder"] = WhatsAppPromptBuilder()
+        # Created last: it picks up the services above. Holds per-user history and caches.
+        app.extensions["chat_assistant"] = ChatAssistant()
+
     # Import and register blueprints, if any
     app.register_blueprint(webhook_blueprint)
 
@@ -1,12 +1,103 @@
 """WhatsApp Adapter for sending messages via the Meta Cloud API."""
+import atexit
 import json
 import logging
+import threading
+from types import MappingProxyType
+from typing import Dict, List, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import current_app
 import re
 
 logger = logging.getLogger(__name__)
 
+# Outgoing text formatting runs on every send, so the patterns are compiled once
+_BRACKETS_RE = re.compile(r"\【.*?\】")  # Custom citation brackets like 【...】
+_MARKDOWN_BOLD_RE = re.compile(r"\*\*(.*?)\*\*")  # Markdown bold **text**
+
+# Shared across all WhatsAppAdapter instances in the process so keep-alive
+# connections to graph.facebook.com are reused instead of re-handshaking per send.
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+class _BoundedRetry(Retry):
+    """Retry that never sleeps longer than backoff_max, even for a large Retry-After."""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.backoff_max)
+
+
+# Transient Graph API failures (rate limiting, edge 5xx) are retried inside the
+# connection pool with jittered exponential backoff. backoff_max keeps the total
+# retry budget bounded (~0.5s + 1s + 2s plus jitter) on top of the per-attempt timeout.
+# Read errors are not retried: Meta may already have accepted the message.
+_SEND_RETRY = _BoundedRetry(
+    total=3,
+    connect=3,
+    read=0,
+    backoff_factor=0.5,
+    backoff_max=4,
+    backoff_jitter=0.25,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["POST"],
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+
+# Maximum body length of a WhatsApp text message accepted by the Cloud API
+MAX_TEXT_LENGTH = 4096
+
+
+def _split_text(text: str, limit: int = MAX_TEXT_LENGTH) -> List[str]:
+    """Splits text into pieces of at most limit characters.
+
+    Each cut is made at the last paragraph break, line break or space before
+    the limit, falling back to a hard cut for unbroken text.
+    """
+    pieces = []
+    while len(text) > limit:
+        cut = -1
+        for separator in ("\n\n", "\n", " "):
+            cut = text.rfind(separator, 0, limit)
+            if cut > 0:
+                break
+        if cut <= 0:
+            cut = limit
+        pieces.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+# Text message payload with the constant fields pre-serialized; the two %s slots
+# take the JSON-encoded recipient and body.
+_TEXT_PAYLOAD_TEMPLATE = (
+    b'{"messaging_product":"whatsapp","recipient_type":"individual","to":%s,'
+    b'"type":"text","text":{"preview_url":false,"body":%s}}'
+)
+
+
+def _get_session() -> requests.Session:
+    """Returns the process-wide pooled session used for Graph API calls."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.mount(
+                    "https://",
+                    HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=_SEND_RETRY),
+                )
+                _session = session
+    return _session
+
 class WhatsAppAdapter:
     """Handles sending messages through the WhatsApp Cloud API."""
 
@@ -24,50 +115,70 @@ class WhatsAppAdapter:
             # Consider raising an error
         
         self.base_url = f"https://graph.facebook.com/{self.api_version}/{self.phone_number_id}/messages"
-        logger.info(f"WhatsAppAdapter initialized for API v{self.api_version}, PhoneID: {self.phone_number_id}")
+        # Built once and read-only, since every send reuses the same mapping
+        self._headers = MappingProxyType({
+            "Content-type": "application/json",
+            "Authorization": f"Bearer {self.access_token}",
+        })
+        self._session = _get_session()
+
+        # Per-recipient buffers for queue_text_message; texts queued within the
+        # debounce window are joined and sent as a single message.
+        # Off by default, since it delays every reply by the debounce window.
+        self.reply_debounce_seconds = current_app.config.get("REPLY_DEBOUNCE_SECONDS", 0)
+        self._pending_texts: Dict[str, List[str]] = {}
+        self._pending_timers: Dict[str, threading.Timer] = {}
+        self._pending_lock = threading.Lock()
+        if self.reply_debounce_seconds > 0:
+            # Timers are daemon threads; send whatever is still queued on exit
+            atexit.register(self.flush_pending_texts)
+        logger.info("WhatsAppAdapter initialized for API v%s, PhoneID: %s", self.api_version, self.phone_number_id)
 
     def _format_outgoing_text(self, text: str) -> str:
         """Formats text for WhatsApp (e.g., markdown bold, bracket removal)."""
-        # Remove custom brackets like 【.*?】
-        text = re.sub(r"\【.*?\】", "", text).strip()
-        # Convert markdown bold **text** to WhatsApp bold *text*
-        text = re.sub(r"\*\*(.*?)\*\*", r"*\1*", text)
-        return text
+        # Remove custom brackets, then convert markdown bold to WhatsApp bold *text*
+        return _MARKDOWN_BOLD_RE.sub(r"*\1*", _BRACKETS_RE.sub("", text).strip())
 
     def _log_http_response(self, response: requests.Response) -> None:
         """Logs details of an HTTP response."""
-        logger.info(f"WhatsApp API Response Status: {response.status_code}")
-        logger.debug(f"WhatsApp API Response Content-type: {response.headers.get('content-type')}")
-        logger.debug(f"WhatsApp API Response Body: {response.text}")
+        logger.info("WhatsApp API Response Status: %s", response.status_code)
+        if logger.isEnabledFor(logging.DEBUG):
+            # Avoid decoding and formatting the response body unless it will be logged
+            logger.debug("WhatsApp API Response Content-type: %s", response.headers.get('content-type'))
+            logger.debug("WhatsApp API Response Body: %s", response.text)
 
-    def _get_text_message_payload(self, recipient_wa_id_with_plus: str, text: str) -> str:
+    def _get_text_message_payload(self, recipient_wa_id_with_plus: str, text: str) -> bytes:
         """Formats the JSON payload for a text message.
 
+        Only the recipient and body are serialized per call; the constant
+        fields come from a preformatted template.
+
         Args:
             recipient_wa_id_with_plus (str): The recipient's WhatsApp ID, including leading '+'.
             text (str): The message text to send.
 
         Returns:
-            str: A JSON string representing the message payload.
+            bytes: The UTF-8 encoded JSON message payload.
         """
-        return json.dumps({
-            "messaging_product": "whatsapp",
-            "recipient_type": "individual",
-            "to": recipient_wa_id_with_plus,
-            "type": "text",
-            "text": {"preview_url": False, "body": text},
-        })
+        return _TEXT_PAYLOAD_TEMPLATE % (
+            json.dumps(recipient_wa_id_with_plus).encode("utf-8"),
+            json.dumps(text).encode("utf-8"),
+        )
 
     def send_text_message(self, recipient_wa_id: str, text: str) -> bool:
         """Sends a text message to a WhatsApp user.
 
+        Empty (or whitespace-only) text is not sent, and text longer than
+        MAX_TEXT_LENGTH is split at paragraph, line or word boundaries and
+        sent as several consecutive messages.
+
         Args:
             recipient_wa_id (str): The recipient's WhatsApp ID (e.g., "65...").
                                      The '+' will be prepended automatically.
             text (str): The message text to send.
 
         Returns:
-            bool: True if the message was sent successfully (API accepted), False otherwise.
+            bool: True if every message was sent successfully (API accepted), False otherwise.
         """
         if not self.phone_number_id or not self.access_token:
             logger.error(
@@ -76,26 +187,87 @@ class WhatsAppAdapter:
             return False
 
         formatted_recipient_id = f"+{recipient_wa_id}"
-        processed_text = self._format_outgoing_text(text)
+        processed_text = self._format_outgoing_text(text or "")
+        if not processed_text:
+            logger.warning("Not sending empty message to %s", formatted_recipient_id)
+            return False
+        if len(processed_text) <= MAX_TEXT_LENGTH:
+            return self._post_text(formatted_recipient_id, processed_text)
+        # Meta rejects longer bodies outright; split instead of losing part of the reply
+        pieces = _split_text(processed_text)
+        logger.info(
+            "Splitting %s-character message to %s into %s messages",
+            len(processed_text), formatted_recipient_id, len(pieces),
+        )
+        for piece in pieces:
+            if not self._post_text(formatted_recipient_id, piece):
+                return False  # Don't send later pieces out of context
+        return True
+
+    def _post_text(self, formatted_recipient_id: str, processed_text: str) -> bool:
+        """Posts one already formatted text message of at most MAX_TEXT_LENGTH characters."""
         payload = self._get_text_message_payload(formatted_recipient_id, processed_text)
-        headers = {
-            "Content-type": "application/json",
-            "Authorization": f"Bearer {self.access_token}",
-        }
 
-        logger.info(f"Sending message to {formatted_recipient_id}: {processed_text[:50]}...") # Log snippet
+        logger.info("Sending message to %s: %s...", formatted_recipient_id, processed_text[:50]) # Log snippet
         try:
-            response = requests.post(self.base_url, data=payload, headers=headers, timeout=10)
+            response = self._session.post(
+                self.base_url, data=payload, headers=self._headers, timeout=(3, 10)
+            )
             self._log_http_response(response) # Log all responses
             response.raise_for_status()  # Raises HTTPError for bad responses (4XX or 5XX)
-            logger.info(f"Message sent successfully to {formatted_recipient_id}")
+            logger.info("Message sent successfully to %s", formatted_recipient_id)
             return True
         except requests.Timeout:
-            logger.error(f"Timeout occurred while sending message to {formatted_recipient_id}")
+            logger.error("Timeout occurred while sending message to %s", formatted_recipient_id)
             return False
         except requests.RequestException as e:
-            logger.error(f"Request failed sending message to {formatted_recipient_id}: {e}")
+            logger.error("Request failed sending message to %s: %s", formatted_recipient_id, e)
             if hasattr(e, 'response') and e.response is not None:
                 # Log details from the error response if available
                 self._log_http_response(e.response) 
             return False
+
+    def queue_text_message(self, recipient_wa_id: str, text: str) -> None:
+        """Queues a text message, coalescing texts to the same user into one send.
+
+        Each call (re)starts a short debounce timer for the recipient; when it
+        fires, all queued texts are joined with blank lines and sent with a
+        single Graph API call (split only if the result exceeds
+        MAX_TEXT_LENGTH). A debounce of 0, the default, sends immediately.
+
+        Args:
+            recipient_wa_id (str): The recipient's WhatsApp ID (without '+').
+            text (str): The message text to queue.
+        """
+        if self.reply_debounce_seconds <= 0:
+            self.send_text_message(recipient_wa_id, text)
+            return
+
+        with self._pending_lock:
+            self._pending_texts.setdefault(recipient_wa_id, []).append(text)
+            previous_timer = self._pending_timers.get(recipient_wa_id)
+            if previous_timer:
+                previous_timer.cancel()
+            timer = threading.Timer(
+                self.reply_debounce_seconds, self._flush_pending_texts, args=(recipient_wa_id,)
+            )
+            timer.daemon = True
+            self._pending_timers[recipient_wa_id] = timer
+            timer.start()
+
+    def _flush_pending_texts(self, recipient_wa_id: str) -> None:
+        """Sends everything queued for a recipient as one message."""
+        with self._pending_lock:
+            texts = self._pending_texts.pop(recipient_wa_id, None)
+            self._pending_timers.pop(recipient_wa_id, None)
+        if texts:
+            self.send_text_message(recipient_wa_id, "\n\n".join(texts))
+
+    def flush_pending_texts(self) -> None:
+        """Immediately sends every queued text, e.g. at shutdown."""
+        with self._pending_lock:
+            recipients = list(self._pending_texts)
+            for timer in self._pending_timers.values():
+                timer.cancel()
+        for recipient_wa_id in recipients:
+            self._flush_pending_texts(recipient_wa_id)
@@ -4,27 +4,93 @@ This module defines the ChatAssistant, which orchestrates the bot's responses
 to user messages by interacting with an LLM provider, a prompt builder,
 and a WhatsApp adapter.
 """
+import atexit
 import logging
-import base64 # For image processing
-from typing import Dict, Any, Optional, List, Union
-from collections import defaultdict
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Sequence, Set, Tuple, Union
+
+from flask import current_app
 
 from .providers.llm_provider import LLMProvider
 from .adapters.whatsapp_adapter import WhatsAppAdapter
 from .prompt_builder.whatsapp_prompt_builder import WhatsAppPromptBuilder
+from .history.conversation_store import ConversationStore, summary_message
+from .history.redis_store import RedisConversationStore
+from .cache import TTLCache
+from .serial import KeyedSerialExecutor
 
 logger = logging.getLogger(__name__)
 
+# Fallback replies sent to the user when a step of message handling fails
+APOLOGY_TEXT_REPLY = "I'm having a little trouble thinking right now. Please try again later."
+APOLOGY_IMAGE_REPLY = "I'm having a little trouble thinking about that image. Please try again later."
+APOLOGY_MEDIA_INFO = "I'm sorry, I couldn't retrieve information about the image you sent."
+APOLOGY_MEDIA_DETAILS = "I'm sorry, there was an issue getting the details for your image."
+APOLOGY_MEDIA_DOWNLOAD = "I'm sorry, I couldn't download the image you sent."
+
+# Used to compress older turns into a summary once a user's history nears its limit
+SUMMARY_SYSTEM_PROMPT = (
+    "Summarize the conversation below in at most 100 words. Preserve the user's "
+    "preferences, facts they shared, and any open questions."
+)
+SUMMARY_MAX_TOKENS = 128
+
+# When streaming replies, buffered text is sent once it reaches this length,
+# cut at the last sentence boundary so each WhatsApp message reads naturally.
+STREAM_FLUSH_CHARS = 200
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
 class ChatAssistant:
     """Orchestrates message and image interactions for the WhatsApp bot."""
 
     def __init__(self):
-        """Initializes the assistant with its core components and history management."""
-        self.llm_provider = LLMProvider()
-        self.whatsapp_adapter = WhatsAppAdapter()
-        self.prompt_builder = WhatsAppPromptBuilder()
-        self.user_histories: Dict[str, List[Dict[str, Union[str, List[Dict[str, Any]]]]]] = defaultdict(list)
+        """Initializes the assistant with its core components and history management.
+
+        The LLM provider, WhatsApp adapter and prompt builder are shared
+        instances registered on the Flask app by create_app.
+        """
+        self.llm_provider: LLMProvider = current_app.extensions["llm_provider"]
+        self.whatsapp_adapter: WhatsAppAdapter = current_app.extensions["whatsapp_adapter"]
+        self.prompt_builder: WhatsAppPromptBuilder = current_app.extensions["prompt_builder"]
+        self.message_executor: KeyedSerialExecutor = current_app.extensions["message_executor"]
         self.max_history_turns = 10  # Max user/assistant pairs to keep (system prompt is separate)
+        self.history_token_budget = current_app.config["HISTORY_TOKEN_BUDGET"]
+        self.history_store: Union[ConversationStore, RedisConversationStore]
+        if current_app.config["CONV_MEMORY_BACKEND"] == "redis":
+            self.history_store = RedisConversationStore(
+                redis_url=current_app.config["REDIS_URL"],
+                max_turns=self.max_history_turns,
+                idle_ttl=current_app.config["CONV_HISTORY_IDLE_TTL"],
+            )
+        else:
+            self.history_store = ConversationStore(
+                max_turns=self.max_history_turns,
+                max_users=current_app.config["CONV_HISTORY_MAX_USERS"],
+                idle_ttl=current_app.config["CONV_HISTORY_IDLE_TTL"],
+            )
+        # Summaries are written off the reply path; if one is not ready in time,
+        # the oldest turns are simply dropped as before.
+        self._summary_executor: Optional[ThreadPoolExecutor] = None
+        if current_app.config["HISTORY_SUMMARY_ENABLED"]:
+            self._summary_executor = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="history-summary"
+            )
+        self._summaries_pending: Set[str] = set()
+        self._summaries_pending_lock = threading.Lock()
+        self.stream_replies = current_app.config["STREAM_REPLIES"]
+        # Inbound texts from the same user within this window are answered as one turn
+        self.inbound_debounce_seconds = current_app.config["INBOUND_DEBOUNCE_SECONDS"]
+        self._pending_inbound: Dict[str, Tuple[str, List[str]]] = {}  # wa_id -> (name, texts)
+        self._pending_inbound_timers: Dict[str, threading.Timer] = {}
+        self._pending_inbound_lock = threading.Lock()
+        if self.inbound_debounce_seconds > 0:
+            # Timers are daemon threads; answer texts still buffered on exit,
+            # since Meta was already told they were received.
+            atexit.register(self.flush_pending_inbound)
+        # Encoded images can be several MB each, so keep the media cache small.
+        self.media_cache = TTLCache(maxsize=64, ttl=1800)  # image_id -> data URL
         logger.info(
             "ChatAssistant initialized with LLMProvider, WhatsAppAdapter, and WhatsAppPromptBuilder."
         )
@@ -32,13 +98,219 @@ class ChatAssistant:
     def _append_to_history(
         self, wa_id: str, role: str, content: Union[str, List[Dict[str, Any]]]
     ) -> None:
-        """Appends a message to the user's conversation history and truncates if necessary."""
-        self.user_histories[wa_id].append({"role": role, "content": content})
-        current_history = self.user_histories[wa_id]
-        # Truncate, preserving user/assistant turn structure if possible
-        if len(current_history) > self.max_history_turns * 2:
-            # Keep the most recent N turns
-            self.user_histories[wa_id] = current_history[-(self.max_history_turns * 2):]
+        """Appends a message to the user's conversation history (bounded by the store)."""
+        self.history_store.append(wa_id, role, content)
+
+    def _complete_and_reply(
+        self,
+        wa_id: str,
+        messages_payload: List[Dict[str, Any]],
+        user_history_content: Union[str, List[Dict[str, Any]]],
+        apology_text: str,
+        message_kind: str,
+    ) -> None:
+        """Gets the LLM reply, sends it, and records the user and assistant turns.
+
+        Must be called from the user's serial message queue, after the prompt
+        has been built from the history snapshot.
+
+        Args:
+            wa_id (str): The WhatsApp ID of the user.
+            messages_payload (List[Dict[str, Any]]): The prompt to send to the LLM.
+            user_history_content (Union[str, List[Dict[str, Any]]]): What to store
+                in history for the user's turn.
+            apology_text (str): Reply sent if the LLM returns nothing or the
+                streamed reply breaks off.
+            message_kind (str): The kind of message being answered, for logging.
+        """
+        if self.stream_replies:
+            llm_reply_text = self._stream_reply(wa_id, messages_payload)
+        else:
+            llm_reply_text = self.llm_provider.get_chat_completion(messages_payload)
+            if llm_reply_text:
+                self.whatsapp_adapter.queue_text_message(wa_id, llm_reply_text)
+
+        # History is written *after* the prompt was built from the snapshot, and the
+        # user and assistant turns go in together with a single store lookup.
+        if llm_reply_text:
+            self.history_store.append_many(
+                wa_id, (("user", user_history_content), ("assistant", llm_reply_text))
+            )
+            self._maybe_schedule_summary(wa_id)
+        else:
+            self._append_to_history(wa_id, "user", user_history_content)
+            logger.error("LLMProvider returned no complete reply for %s message from %s", message_kind, wa_id)
+            self.whatsapp_adapter.send_text_message(wa_id, apology_text)
+
+    def _stream_reply(self, wa_id: str, messages_payload: List[Dict[str, Any]]) -> Optional[str]:
+        """Streams the LLM reply to the user in sentence-aligned pieces as it is generated.
+
+        Each piece is sent as its own WhatsApp message right away, bypassing
+        reply coalescing so the user sees the answer arrive progressively.
+
+        Args:
+            wa_id (str): The WhatsApp ID of the user.
+            messages_payload (List[Dict[str, Any]]): The prompt to send to the LLM.
+
+        Returns:
+            Optional[str]: The full reply text for history, "" if nothing was
+                generated, or None if the stream failed part way.
+        """
+        parts: List[str] = []
+        pending = ""
+        try:
+            for delta in self.llm_provider.stream_chat_completion(messages_payload):
+                parts.append(delta)
+                pending += delta
+                if len(pending) < STREAM_FLUSH_CHARS:
+                    continue
+                cut = 0
+                for match in _SENTENCE_END_RE.finditer(pending):
+                    cut = match.end()
+                if cut:
+                    self.whatsapp_adapter.send_text_message(wa_id, pending[:cut].strip())
+                    pending = pending[cut:]
+        except Exception:
+            # Whatever was already sent stays sent, but the truncated reply is
+            # neither completed nor recorded; the caller apologizes instead.
+            return None
+        if pending.strip():
+            self.whatsapp_adapter.send_text_message(wa_id, pending.strip())
+        return "".join(parts).strip()
+
+    def _maybe_schedule_summary(self, wa_id: str) -> None:
+        """Queues a background summary of the oldest turns once history is nearly full.
+
+        Must be called from the user's serial message queue.
+        """
+        if self._summary_executor is None:
+            return
+        messages = self.history_store.get(wa_id, include_summary=False)
+        # Trigger one exchange before the store starts dropping turns
+        if len(messages) < self.max_history_turns * 2 - 2:
+            return
+        count = self.max_history_turns - self.max_history_turns % 2  # Whole user/assistant pairs
+        if count < 2:
+            return
+        with self._summaries_pending_lock:
+            if wa_id in self._summaries_pending:
+                return
+            self._summaries_pending.add(wa_id)
+        self._summary_executor.submit(self._summarize_oldest, wa_id, messages[:count])
+
+    def _summarize_oldest(self, wa_id: str, to_summarize: Sequence[Dict[str, Any]]) -> None:
+        """Summarizes the given oldest turns and swaps them for the summary in history."""
+        try:
+            transcript_lines = []
+            for message in to_summarize:
+                content = message["content"]
+                if not isinstance(content, str):
+                    content = " ".join(part.get("text", "") for part in content)
+                transcript_lines.append(f"{message['role']}: {content}")
+            prompt: List[Dict[str, Any]] = [{"role": "system", "content": SUMMARY_SYSTEM_PROMPT}]
+            previous_summary = self.history_store.get_summary(wa_id)
+            if previous_summary:
+                prompt.append(summary_message(previous_summary))
+            prompt.append({"role": "user", "content": "\n".join(transcript_lines)})
+
+            # Only a complete summary may replace turns; a failed, empty or
+            # truncated one would lose them for good.
+            summary = self.llm_provider.get_finished_completion(
+                prompt, temperature=0, max_tokens=SUMMARY_MAX_TOKENS
+            )
+            if not summary:
+                logger.warning("Conversation summary for %s was not completed; keeping turns.", wa_id)
+                return
+            # Atomic in the store: a no-op if turns were dropped in the meantime
+            replaced = self.history_store.replace_oldest_with_summary(
+                wa_id, to_summarize, summary
+            )
+            if replaced:
+                logger.info("Summarized %s older messages for %s.", len(to_summarize), wa_id)
+            else:
+                logger.info("History for %s changed while summarizing; summary discarded.", wa_id)
+        except Exception:
+            logger.exception("Failed to summarize conversation history for %s.", wa_id)
+        finally:
+            with self._summaries_pending_lock:
+                self._summaries_pending.discard(wa_id)
+
+    def receive_text_message(self, wa_id: str, name: str, text_body: str) -> None:
+        """Accepts an incoming text message, batching quick successive messages.
+
+        Each call (re)starts a short debounce timer for the user; when it fires,
+        the buffered texts are queued on the user's serial message queue, joined
+        with newlines and answered as a single turn, so a burst of short
+        messages costs one LLM call. A debounce of 0 handles every message
+        immediately.
+
+        Must be called from the user's serial message queue.
+
+        Args:
+            wa_id (str): The WhatsApp ID of the user.
+            name (str): The name of the user.
+            text_body (str): The text content of the message.
+        """
+        if self.inbound_debounce_seconds <= 0:
+            self.handle_text_message(wa_id, name, text_body)
+            return
+
+        with self._pending_inbound_lock:
+            _, texts = self._pending_inbound.setdefault(wa_id, (name, []))
+            texts.append(text_body)
+            previous_timer = self._pending_inbound_timers.get(wa_id)
+            if previous_timer:
+                previous_timer.cancel()
+            # The timer thread only enqueues the flush; the LLM call runs on the
+            # bounded message pool, in order with the user's other messages.
+            timer = threading.Timer(
+                self.inbound_debounce_seconds,
+                self.message_executor.submit,
+                args=(wa_id, self._flush_inbound_texts, wa_id),
+            )
+            timer.daemon = True
+            self._pending_inbound_timers[wa_id] = timer
+            timer.start()
+
+    def receive_image_message(
+        self, wa_id: str, name: str, image_id: str, caption: Optional[str]
+    ) -> None:
+        """Accepts an incoming image message after any texts the user sent before it.
+
+        Texts still waiting out the debounce window are answered first, so
+        replies follow the order in which the user's messages arrived.
+
+        Must be called from the user's serial message queue.
+
+        Args:
+            wa_id (str): The WhatsApp ID of the user.
+            name (str): The name of the user.
+            image_id (str): The ID of the received image.
+            caption (Optional[str]): The caption accompanying the image, if any.
+        """
+        self._flush_inbound_texts(wa_id)
+        self.handle_image_message(wa_id, name, image_id, caption)
+
+    def _flush_inbound_texts(self, wa_id: str) -> None:
+        """Answers everything buffered for a user as one text turn."""
+        with self._pending_inbound_lock:
+            pending = self._pending_inbound.pop(wa_id, None)
+            timer = self._pending_inbound_timers.pop(wa_id, None)
+        if timer:
+            timer.cancel()  # Flushed early, e.g. ahead of an image
+        if not pending:
+            return
+        name, texts = pending
+        self.handle_text_message(wa_id, name, "\n".join(texts))
+
+    def flush_pending_inbound(self) -> None:
+        """Immediately queues every buffered inbound text for answering, e.g. at shutdown."""
+        with self._pending_inbound_lock:
+            wa_ids = list(self._pending_inbound)
+            for timer in self._pending_inbound_timers.values():
+                timer.cancel()
+        for wa_id in wa_ids:
+            self.message_executor.submit(wa_id, self._flush_inbound_texts, wa_id)
 
     def handle_text_message(self, wa_id: str, name: str, text_body: str) -> None:
         """Processes a text message, gets an LLM response, and sends it.
@@ -48,28 +320,58 @@ class ChatAssistant:
             name (str): The name of the user.
             text_body (str): The text content of the message.
         """
-        logger.info(f"ChatAssistant handling text message from {name} ({wa_id}): '{text_body}'")
+        logger.info("ChatAssistant handling text message from %s (%s): '%s'", name, wa_id, text_body)
         
-        history_for_prompt = list(self.user_histories[wa_id]) # Use a copy for prompt building
+        # Turns for one user arrive one at a time through the serial message
+        # queue, so history updates and replies stay in order without a lock.
+        history_for_prompt = self.history_store.get(
+            wa_id, token_budget=self.history_token_budget
+        ) # Immutable snapshot, trimmed to the token budget
         messages_payload = self.prompt_builder.build_text_prompt(
             name=name, text_body=text_body, history=history_for_prompt
         )
-        
-        # Append actual user message to stored history *after* it's used for current prompt
-        self._append_to_history(wa_id, "user", text_body)
 
-        llm_reply_text = self.llm_provider.get_chat_completion(messages_payload)
+        self._complete_and_reply(
+            wa_id, messages_payload, text_body, APOLOGY_TEXT_REPLY, "text"
+        )
 
-        if llm_reply_text:
-            self._append_to_history(wa_id, "assistant", llm_reply_text)
-            if self.whatsapp_adapter:
-                self.whatsapp_adapter.send_text_message(wa_id, llm_reply_text)
-            else:
-                logger.error("WhatsAppAdapter not available, cannot send reply.")
-        else:
-            logger.error(f"LLMProvider returned no reply for text message from {wa_id}")
-            if self.whatsapp_adapter:
-                self.whatsapp_adapter.send_text_message(wa_id, "I'm having a little trouble thinking right now. Please try again later.")
+    def _get_image_data_url(self, wa_id: str, name: str, image_id: str) -> Optional[str]:
+        """Returns the image as a base64 data URL, fetching it from Meta on a cache miss.
+
+        Data URLs are cached by image_id. On failure the user is notified and
+        None is returned.
+        """
+        cached_data_url = self.media_cache.get(image_id)
+        if cached_data_url:
+            logger.info("Using cached data URL for image_id: %s", image_id)
+            return cached_data_url
+
+        media_info = self.llm_provider.get_media_info(image_id)
+        if not media_info:
+            logger.error("Failed to get media info for image_id: %s from %s (%s)", image_id, name, wa_id)
+            self.whatsapp_adapter.send_text_message(wa_id, APOLOGY_MEDIA_INFO)
+            return None
+
+        download_url = media_info.get("url")
+        mime_type = media_info.get("mime_type")
+        if not download_url or not mime_type:
+            logger.error("Media info for %s incomplete for %s (%s). URL or MIME type missing.", image_id, name, wa_id)
+            self.whatsapp_adapter.send_text_message(wa_id, APOLOGY_MEDIA_DETAILS)
+            return None
+
+        # The download is streamed straight into a base64 buffer that already
+        # carries the data URL header, so only one encoded copy is ever built.
+        encoded_data_url = self.llm_provider.download_media_base64(
+            download_url, prefix=f"data:{mime_type};base64,".encode("ascii")
+        )
+        if not encoded_data_url:
+            logger.error("Failed to download image content for image_id: %s from %s (%s)", image_id, name, wa_id)
+            self.whatsapp_adapter.send_text_message(wa_id, APOLOGY_MEDIA_DOWNLOAD)
+            return None
+
+        data_url = encoded_data_url.decode("ascii")
+        self.media_cache.set(image_id, data_url)
+        return data_url
 
     def handle_image_message(
         self, wa_id: str, name: str, image_id: str, caption: Optional[str]
@@ -82,64 +384,31 @@ class ChatAssistant:
             image_id (str): The ID of the received image.
             caption (Optional[str]): The caption accompanying the image, if any.
         """
-        logger.info(f"ChatAssistant handling image message from {name} ({wa_id}), image_id: {image_id}, caption: '{caption}'")
-
-        media_info = self.llm_provider.get_media_info(image_id)
-        if not media_info:
-            logger.error(f"Failed to get media info for image_id: {image_id} from {name} ({wa_id})")
-            if self.whatsapp_adapter:
-                self.whatsapp_adapter.send_text_message(wa_id, "I'm sorry, I couldn't retrieve information about the image you sent.")
-            return
+        logger.info("ChatAssistant handling image message from %s (%s), image_id: %s, caption: '%s'", name, wa_id, image_id, caption)
 
-        download_url = media_info.get("url")
-        mime_type = media_info.get("mime_type")
-        if not download_url or not mime_type:
-            logger.error(f"Media info for {image_id} incomplete for {name} ({wa_id}). URL or MIME type missing.")
-            if self.whatsapp_adapter:
-                self.whatsapp_adapter.send_text_message(wa_id, "I'm sorry, there was an issue getting the details for your image.")
+        data_url = self._get_image_data_url(wa_id, name, image_id)
+        if not data_url:
             return
 
-        image_bytes = self.llm_provider.download_media_content(download_url)
-        if not image_bytes:
-            logger.error(f"Failed to download image content for image_id: {image_id} from {name} ({wa_id})")
-            if self.whatsapp_adapter:
-                self.whatsapp_adapter.send_text_message(wa_id, "I'm sorry, I couldn't download the image you sent.")
-            return
-
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
-        data_url = f"data:{mime_type};base64,{base64_image}"
-        
-        history_for_prompt = list(self.user_histories[wa_id]) # Use a copy
+        history_for_prompt = self.history_store.get(
+            wa_id, token_budget=self.history_token_budget
+        ) # Immutable snapshot, trimmed to the token budget
         messages_payload = self.prompt_builder.build_image_prompt(
             name=name, 
             image_data_url=data_url, 
             caption=caption, 
             history=history_for_prompt
         )
-        
-        # For history, store a simplified representation or just the text part if a data_url is too large/complex
-        # Here we construct the user message content part that includes text and image_url for LLM.
-        user_multimodal_content_parts = []
+
+        # Store only a text description of the image in history. The base64 data URL
+        # can be several MB and later turns never need to re-send the image itself.
         text_part_for_history = f"User sent an image (ID: {image_id})."
         if caption:
             text_part_for_history += f" Caption: '{caption}'"
-        user_multimodal_content_parts.append({"type": "text", "text": text_part_for_history})
-        # For the actual LLM call, the prompt_builder already includes the image_url.
-        # For storing in _CONV_HISTORY, we might simplify or store what was actually sent.
-        # The current messages_payload already has the full structure.
-        # The _append_to_history expects content that matches what an LLM would receive for user.
-        # So, the messages_payload[-1]["content"] is what we store for the user turn if it's complex.
-        self._append_to_history(wa_id, "user", messages_payload[-1]["content"]) 
-
-        llm_reply_text = self.llm_provider.get_chat_completion(messages_payload)
-
-        if llm_reply_text:
-            self._append_to_history(wa_id, "assistant", llm_reply_text)
-            if self.whatsapp_adapter:
-                self.whatsapp_adapter.send_text_message(wa_id, llm_reply_text)
-            else:
-                logger.error("WhatsAppAdapter not initialized, cannot send reply for image.")
-        else:
-            logger.error(f"LLMProvider returned no reply for image message from {wa_id}")
-            if self.whatsapp_adapter:
-                self.whatsapp_adapter.send_text_message(wa_id, "I'm having a little trouble thinking about that image. Please try again later.")
+        self._complete_and_reply(
+            wa_id,
+            messages_payload,
+            [{"type": "text", "text": text_part_for_history}],
+            APOLOGY_IMAGE_REPLY,
+            "image",
+        )
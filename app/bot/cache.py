@@ -0,0 +1,112 @@
+"""In-process caching utilities for the bot.
+
+This module provides TTLCache, a small thread-safe LRU mapping whose entries
+also expire after a period of inactivity. It is used to keep per-user and
+per-media state bounded in long-running workers.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with optional idle-time expiry."""
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        on_evict: Optional[Callable[[Hashable, Any, str], None]] = None,
+    ):
+        """Initializes the cache.
+
+        Args:
+            maxsize (int): Maximum number of entries; the least recently used
+                entry is evicted when the limit is exceeded.
+            ttl (Optional[float]): Seconds an entry may stay unused before it
+                expires. None disables expiry.
+            on_evict (Optional[Callable[[Hashable, Any, str], None]]): Called
+                with (key, value, reason) when an entry is dropped for
+                "capacity" or "expired". It runs with the cache lock held, so
+                it must be quick and must not use the cache.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        # Ordered from least to most recently used; values are (last_used, value).
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        """Drops expired entries. Must be called with the lock held.
+
+        Entries are kept in recency order, so only the expired prefix is visited.
+        """
+        if self.ttl is None:
+            return
+        cutoff = now - self.ttl
+        while self._data:
+            key, (last_used, value) = next(iter(self._data.items()))
+            if last_used > cutoff:
+                break
+            del self._data[key]
+            if self.on_evict is not None:
+                self.on_evict(key, value, "expired")
+
+    def _store(self, key: Hashable, value: Any, now: float) -> None:
+        """Inserts or refreshes an entry and enforces maxsize. Lock must be held."""
+        self._data[key] = (now, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            evicted_key, (_, evicted_value) = self._data.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(evicted_key, evicted_value, "capacity")
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value for key, refreshing its recency, or default."""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value = entry[1]
+            self._data[key] = (now, value)
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Stores value under key as the most recently used entry."""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            self._store(key, value, now)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Returns the value for key, creating it with factory() on a miss."""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self._data.get(key, _MISSING)
+            value = factory() if entry is _MISSING else entry[1]
+            self._store(key, value, now)
+            return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Removes key and returns its value, or default if absent."""
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[1]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            self._expire(time.monotonic())
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._data)
@@ -3,32 +3,42 @@
 This module provides decorators to help secure webhook endpoints,
 primarily by validating request signatures.
 """
-from functools import wraps
+from functools import lru_cache, wraps
 from flask import current_app, jsonify, request
 import logging
-import hashlib
 import hmac
 
-def validate_signature(payload: str, signature: str) -> bool:
+_SIGNATURE_PREFIX = "sha256="
+# 'sha256=' followed by the 64-character hex digest
+_SIGNATURE_HEADER_LENGTH = len(_SIGNATURE_PREFIX) + 64
+
+@lru_cache(maxsize=1)
+def _secret_bytes(app_secret: str) -> bytes:
+    """Returns the HMAC key bytes for the APP_SECRET, encoded once and cached."""
+    return app_secret.encode("latin-1")
+
+def validate_signature(payload: bytes, signature: str) -> bool:
     """Validates an incoming payload's signature.
 
     Compares the provided signature with an expected signature generated
     using the APP_SECRET and the payload.
 
     Args:
-        payload (str): The raw request payload string to validate.
+        payload (bytes): The raw request body exactly as received. Hashing the
+            original bytes avoids a decode/re-encode round-trip that could
+            also alter the signed content.
         signature (str): The signature string from the request
             (e.g., from 'X-Hub-Signature-256' header).
 
     Returns:
         bool: True if the signature is valid, False otherwise.
     """
-    # Use the App Secret to hash the payload
-    expected_signature = hmac.new(
-        bytes(current_app.config["APP_SECRET"], "latin-1"),
-        msg=payload.encode("utf-8"),
-        digestmod=hashlib.sha256,
-    ).hexdigest()
+    # Use the App Secret to hash the payload (single-shot C implementation)
+    expected_signature = hmac.digest(
+        _secret_bytes(current_app.config["APP_SECRET"]),
+        payload,
+        "sha256",
+    ).hex()
 
     # Check if the signature matches
     return hmac.compare_digest(expected_signature, signature)
@@ -46,15 +56,22 @@ def signature_required(f):
     Returns:
         The decorated function, which will first perform signature validation
         before executing the original view function. Returns a 403 error
-        if signature validation fails.
+        if signature validation fails. Requests whose header is missing or
+        malformed are rejected without hashing the payload.
     """
 
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        signature = request.headers.get("X-Hub-Signature-256", "")[
-            7:
-        ]  # Removing 'sha256='
-        if not validate_signature(request.data.decode("utf-8"), signature):
+        signature_header = request.headers.get("X-Hub-Signature-256", "")
+        # Reject missing or malformed headers before hashing the payload
+        if (
+            len(signature_header) != _SIGNATURE_HEADER_LENGTH
+            or not signature_header.startswith(_SIGNATURE_PREFIX)
+        ):
+            logging.info("Signature verification failed: missing or malformed header.")
+            return jsonify({"status": "error", "message": "Invalid signature"}), 403
+        signature = signature_header[len(_SIGNATURE_PREFIX):]
+        if not validate_signature(request.get_data(cache=True), signature):
             logging.info("Signature verification failed!")
             return jsonify({"status": "error", "message": "Invalid signature"}), 403
         return f(*args, **kwargs)
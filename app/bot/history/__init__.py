@@ -0,0 +1,2 @@
+# app/bot/history/__init__.py
+# This file makes the 'history' directory a Python package.
@@ -0,0 +1,207 @@
+"""Conversation history storage.
+
+This module defines ConversationStore, which keeps the recent turns of each
+user's conversation in memory. Both the number of turns per user and the
+number of users retained are bounded, so memory use stays flat in
+long-running workers.
+"""
+import logging
+import threading
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, Iterable, Optional, Sequence, Tuple
+
+from ..cache import TTLCache
+from ..tokens import MessageContent, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+HistoryContent = MessageContent
+
+# How a stored summary of older, dropped turns is presented to the model
+SUMMARY_MESSAGE_TEMPLATE = "Summary of the earlier conversation: {summary}"
+
+
+def summary_message(summary: str) -> Dict[str, HistoryContent]:
+    """Returns the system message that carries a conversation summary."""
+    return {"role": "system", "content": SUMMARY_MESSAGE_TEMPLATE.format(summary=summary)}
+
+def budget_start_index(
+    roles: Sequence[str],
+    tokens: Sequence[int],
+    token_budget: int,
+    total_tokens: Optional[int] = None,
+) -> int:
+    """Returns the index of the oldest message to keep within a token budget.
+
+    The newest messages whose estimated tokens fit in token_budget are kept,
+    and the kept range always opens with a user message.
+
+    Args:
+        roles (Sequence[str]): Message roles, oldest first.
+        tokens (Sequence[int]): Estimated tokens per message, aligned with roles.
+        token_budget (int): Maximum total estimated tokens to keep.
+        total_tokens (Optional[int]): The sum of tokens, if the caller keeps a
+            running total; when it fits the budget the scan is skipped.
+
+    Returns:
+        int: The start index; len(roles) if nothing fits.
+    """
+    if total_tokens is not None and total_tokens <= token_budget:
+        start = 0
+    else:
+        start = len(tokens)
+        used = 0
+        for message_tokens in reversed(tokens):
+            used += message_tokens
+            if used > token_budget:
+                break
+            start -= 1
+    # Don't open the snapshot with an assistant reply to a dropped question
+    while start < len(roles) and roles[start] != "user":
+        start += 1
+    return start
+
+
+class _UserHistory:
+    """One user's turns stored as parallel role, content and token-count deques.
+
+    Keeping roles and contents in flat deques avoids a dict per stored
+    message; the message dicts the API needs are only built on read. Token
+    estimates are computed once on append so trimming never re-scans content.
+    The optional summary stands in for turns that were summarized away, and
+    total_tokens is kept as a running sum of tokens.
+    """
+
+    __slots__ = ("roles", "contents", "tokens", "total_tokens", "summary")
+
+    def __init__(self, maxlen: int):
+        self.roles: Deque[str] = deque(maxlen=maxlen)
+        self.contents: Deque[HistoryContent] = deque(maxlen=maxlen)
+        self.tokens: Deque[int] = deque(maxlen=maxlen)
+        self.total_tokens = 0
+        self.summary: Optional[str] = None
+
+
+class ConversationStore:
+    """Bounded in-memory conversation history keyed by WhatsApp ID."""
+
+    def __init__(self, max_turns: int = 10, max_users: int = 10_000, idle_ttl: float = 3600):
+        """Initializes the store.
+
+        Args:
+            max_turns (int): Max user/assistant pairs kept per user.
+            max_users (int): Max number of users whose history is retained;
+                the least recently active user is evicted first.
+            idle_ttl (float): Seconds of inactivity after which a user's
+                history is discarded.
+        """
+        self.max_turns = max_turns
+        self._histories = TTLCache(maxsize=max_users, ttl=idle_ttl, on_evict=self._log_eviction)
+        # Guards the per-user deques; held only for in-memory work, never for I/O,
+        # since the background summarizer can rewrite a history mid-conversation.
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _log_eviction(wa_id: str, history: "_UserHistory", reason: str) -> None:
+        # Frequent capacity evictions mean CONV_HISTORY_MAX_USERS is too low
+        if reason == "capacity":
+            logger.info("Evicted conversation history for %s (max users reached).", wa_id)
+        else:
+            logger.debug("Expired idle conversation history for %s.", wa_id)
+
+    def _new_history(self) -> _UserHistory:
+        return _UserHistory(maxlen=self.max_turns * 2)
+
+    def get(
+        self, wa_id: str, token_budget: Optional[int] = None, include_summary: bool = True
+    ) -> Tuple[Dict[str, HistoryContent], ...]:
+        """Returns an immutable snapshot of the user's history, oldest message first.
+
+        Callers can pass the snapshot straight to the prompt builder without
+        copying it again.
+
+        Args:
+            wa_id (str): The WhatsApp ID of the user.
+            token_budget (Optional[int]): If given, only the most recent
+                messages whose estimated tokens fit within the budget are
+                returned, starting from a user message.
+            include_summary (bool): Whether to lead with the summary of
+                earlier turns, if one exists, as a system message.
+        """
+        history = self._histories.get(wa_id)
+        if history is None:
+            return ()
+        with self._lock:
+            start = 0
+            if token_budget is not None:
+                # The running total lets the common under-budget case skip the scan
+                start = budget_start_index(
+                    history.roles, history.tokens, token_budget, history.total_tokens
+                )
+            messages = tuple(
+                {"role": role, "content": content}
+                for role, content in islice(zip(history.roles, history.contents), start, None)
+            )
+            summary = history.summary
+        if include_summary and summary:
+            return (summary_message(summary), *messages)
+        return messages
+
+    def get_summary(self, wa_id: str) -> Optional[str]:
+        """Returns the summary of the user's earlier turns, if any."""
+        history = self._histories.get(wa_id)
+        return history.summary if history is not None else None
+
+    def append(self, wa_id: str, role: str, content: HistoryContent) -> None:
+        """Appends a message; the oldest messages drop off once the limit is reached."""
+        self.append_many(wa_id, ((role, content),))
+
+    def append_many(
+        self, wa_id: str, messages: Iterable[Tuple[str, HistoryContent]]
+    ) -> None:
+        """Appends several (role, content) messages with a single history lookup."""
+        entries = [(role, content, estimate_tokens(content)) for role, content in messages]
+        history = self._histories.get_or_create(wa_id, self._new_history)
+        with self._lock:
+            for role, content, tokens in entries:
+                if len(history.tokens) == history.tokens.maxlen:
+                    history.total_tokens -= history.tokens[0]  # About to be evicted
+                history.roles.append(role)
+                history.contents.append(content)
+                history.tokens.append(tokens)
+                history.total_tokens += tokens
+
+    def replace_oldest_with_summary(
+        self, wa_id: str, summarized: Sequence[Dict[str, HistoryContent]], summary: str
+    ) -> bool:
+        """Drops the oldest messages and records a summary that replaces them.
+
+        Nothing changes unless the oldest messages still match summarized,
+        e.g. because they were evicted while the summary was being written.
+        The check and the replacement are atomic with respect to appends.
+
+        Args:
+            wa_id (str): The WhatsApp ID of the user.
+            summarized (Sequence[Dict[str, HistoryContent]]): The messages the
+                summary covers, as returned by get(include_summary=False).
+            summary (str): The new summary, covering any previous summary too.
+
+        Returns:
+            bool: True if the messages were replaced by the summary.
+        """
+        history = self._histories.get(wa_id)
+        if history is None:
+            return False
+        with self._lock:
+            if len(history.roles) < len(summarized):
+                return False
+            for message, role, content in zip(summarized, history.roles, history.contents):
+                if message["role"] != role or message["content"] != content:
+                    return False
+            for _ in summarized:
+                history.roles.popleft()
+                history.contents.popleft()
+                history.total_tokens -= history.tokens.popleft()
+            history.summary = summary
+        return True
@@ -0,0 +1,184 @@
+"""Redis-backed conversation history storage.
+
+This module defines RedisConversationStore, a drop-in alternative to
+ConversationStore that keeps each user's recent turns in a Redis list so
+history is shared across worker processes and survives restarts. The
+`redis` package is only needed when this backend is selected.
+"""
+import json
+import logging
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from ..tokens import estimate_tokens
+from .conversation_store import HistoryContent, budget_start_index, summary_message
+
+logger = logging.getLogger(__name__)
+
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def _encode_entry(role: str, content: HistoryContent, tokens: int) -> bytes:
+    """Serializes one message as a compact [role, tokens, content] JSON array."""
+    return _json_encoder.encode([role, tokens, content]).encode("utf-8")
+
+
+def _decode_entry(raw: bytes) -> Tuple[str, int, HistoryContent]:
+    """Parses an entry written by _encode_entry."""
+    role, tokens, content = json.loads(raw)
+    return role, tokens, content
+
+
+class RedisConversationStore:
+    """Bounded conversation history kept in one Redis list per WhatsApp ID."""
+
+    def __init__(
+        self,
+        redis_url: str,
+        max_turns: int = 10,
+        idle_ttl: float = 3600,
+        key_prefix: str = "waconv:",
+    ):
+        """Initializes the store. No connection is made until first use.
+
+        Args:
+            redis_url (str): Redis connection URL, e.g. redis://localhost:6379/0.
+            max_turns (int): Max user/assistant pairs kept per user.
+            idle_ttl (float): Seconds of inactivity after which a user's
+                history expires.
+            key_prefix (str): Prefix for the per-user list keys.
+
+        Raises:
+            RuntimeError: If the redis package is not installed.
+        """
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "CONV_MEMORY_BACKEND='redis' requires the 'redis' package (pip install redis)."
+            ) from e
+        self.max_turns = max_turns
+        self.idle_ttl = int(idle_ttl)
+        self.key_prefix = key_prefix
+        # redis-py connects lazily from its pool on the first command
+        self._client = redis.Redis.from_url(redis_url)
+        self._watch_error = redis.WatchError
+
+    def _key(self, wa_id: str) -> str:
+        return f"{self.key_prefix}{wa_id}"
+
+    def _summary_key(self, wa_id: str) -> str:
+        return f"{self.key_prefix}summary:{wa_id}"
+
+    def get(
+        self, wa_id: str, token_budget: Optional[int] = None, include_summary: bool = True
+    ) -> Tuple[Dict[str, HistoryContent], ...]:
+        """Returns an immutable snapshot of the user's history, oldest message first.
+
+        Args:
+            wa_id (str): The WhatsApp ID of the user.
+            token_budget (Optional[int]): If given, only the most recent
+                messages whose estimated tokens fit within the budget are
+                returned, starting from a user message.
+            include_summary (bool): Whether to lead with the summary of
+                earlier turns, if one exists, as a system message.
+
+        Returns:
+            Tuple[Dict[str, HistoryContent], ...]: The messages, or an empty
+                tuple if there is no history or Redis is unavailable.
+        """
+        try:
+            pipe = self._client.pipeline()
+            pipe.lrange(self._key(wa_id), 0, -1)
+            if include_summary:
+                pipe.get(self._summary_key(wa_id))
+            results = pipe.execute()
+        except Exception as e:
+            logger.error("Failed to load conversation history for %s from Redis: %s", wa_id, e)
+            return ()
+        entries = [_decode_entry(raw) for raw in results[0]]
+        start = 0
+        if token_budget is not None:
+            start = budget_start_index(
+                [role for role, _, _ in entries],
+                [tokens for _, tokens, _ in entries],
+                token_budget,
+            )
+        messages = tuple(
+            {"role": role, "content": content} for role, _, content in entries[start:]
+        )
+        if include_summary and results[1]:
+            return (summary_message(results[1].decode("utf-8")), *messages)
+        return messages
+
+    def get_summary(self, wa_id: str) -> Optional[str]:
+        """Returns the summary of the user's earlier turns, if any."""
+        try:
+            summary = self._client.get(self._summary_key(wa_id))
+        except Exception as e:
+            logger.error("Failed to load conversation summary for %s from Redis: %s", wa_id, e)
+            return None
+        return summary.decode("utf-8") if summary else None
+
+    def append(self, wa_id: str, role: str, content: HistoryContent) -> None:
+        """Appends a message; the oldest messages drop off once the limit is reached."""
+        self.append_many(wa_id, ((role, content),))
+
+    def append_many(
+        self, wa_id: str, messages: Iterable[Tuple[str, HistoryContent]]
+    ) -> None:
+        """Appends several (role, content) messages in a single round trip."""
+        key = self._key(wa_id)
+        entries = [
+            _encode_entry(role, content, estimate_tokens(content)) for role, content in messages
+        ]
+        try:
+            pipe = self._client.pipeline()
+            pipe.rpush(key, *entries)
+            pipe.ltrim(key, -self.max_turns * 2, -1)
+            pipe.expire(key, self.idle_ttl)
+            pipe.expire(self._summary_key(wa_id), self.idle_ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.error("Failed to append conversation history for %s to Redis: %s", wa_id, e)
+
+    def replace_oldest_with_summary(
+        self, wa_id: str, summarized: Sequence[Dict[str, HistoryContent]], summary: str
+    ) -> bool:
+        """Drops the oldest messages and records a summary that replaces them.
+
+        Nothing changes unless the oldest messages still match summarized.
+        Appends trim the head of the list once it is full, which is exactly
+        when summaries are written, so the list is WATCHed: if any writer
+        touches it between the comparison and the trim, the transaction is
+        aborted and the summary is discarded.
+
+        Args:
+            wa_id (str): The WhatsApp ID of the user.
+            summarized (Sequence[Dict[str, HistoryContent]]): The messages the
+                summary covers, as returned by get(include_summary=False).
+            summary (str): The new summary, covering any previous summary too.
+
+        Returns:
+            bool: True if the messages were replaced by the summary.
+        """
+        key = self._key(wa_id)
+        count = len(summarized)
+        try:
+            with self._client.pipeline() as pipe:
+                pipe.watch(key)
+                oldest = [_decode_entry(raw) for raw in pipe.lrange(key, 0, count - 1)]
+                if len(oldest) < count or any(
+                    role != message["role"] or content != message["content"]
+                    for (role, _, content), message in zip(oldest, summarized)
+                ):
+                    return False
+                pipe.multi()
+                pipe.ltrim(key, count, -1)
+                pipe.set(self._summary_key(wa_id), summary, ex=self.idle_ttl)
+                pipe.execute()
+        except self._watch_error:
+            return False
+        except Exception as e:
+            logger.error("Failed to store conversation summary for %s in Redis: %s", wa_id, e)
+            return False
+        return True
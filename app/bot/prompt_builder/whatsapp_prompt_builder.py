@@ -5,29 +5,73 @@ constructing the message payloads (prompts) to be sent to the LLM,
 including system messages, conversation history, and current user input
 (text or multimodal for images).
 """
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+# The static instructions are byte-identical for every user and come first, so
+# providers that cache prompts by prefix (OpenAI, Azure OpenAI) can reuse them
+# across conversations. Per-user details are appended to the same system
+# message, since several vLLM chat templates accept only one.
+DEFAULT_TEXT_SYSTEM_PROMPT = (
+    "You are a helpful, concise assistant chatting on WhatsApp. "
+    "Keep answers short and conversational."
+)
+DEFAULT_IMAGE_SYSTEM_PROMPT = (
+    "You are a helpful, concise assistant chatting on WhatsApp. "
+    "The user has sent an image. Describe it briefly if you can, "
+    "and respond to their caption or the image context. "
+    "If you cannot process or describe the image, acknowledge it gracefully."
+)
+USER_CONTEXT_TEMPLATE = "You are chatting with {name}."
+
+
+@lru_cache(maxsize=4096)
+def _format_system_prompt(static_prompt: str, user_context_template: str, name: str) -> str:
+    """Joins the shared instructions and the user context, memoized per user name."""
+    return f"{static_prompt}\n\n{user_context_template.format(name=name)}"
+
 
 class WhatsAppPromptBuilder:
     """Constructs prompts for LLM interactions based on WhatsApp messages."""
 
     def __init__(self):
         """Initializes the prompt builder."""
-        self.default_text_system_prompt_template = (
-            "You are a helpful, concise assistant chatting on WhatsApp with {name}. "
-            "Keep answers short and conversational."
-        )
-        self.default_image_system_prompt_template = (
-            "You are a helpful, concise assistant chatting on WhatsApp with {name}. "
-            "The user has sent an image. Describe it briefly if you can, "
-            "and respond to their caption or the image context. "
-            "If you cannot process or describe the image, acknowledge it gracefully."
-        )
+        self.default_text_system_prompt = DEFAULT_TEXT_SYSTEM_PROMPT
+        self.default_image_system_prompt = DEFAULT_IMAGE_SYSTEM_PROMPT
+        self.user_context_template = USER_CONTEXT_TEMPLATE
+
+    def _build_system_message(
+        self,
+        default_system_prompt: str,
+        name: str,
+        history: Sequence[Dict[str, Any]],
+        system_message_override: Optional[str],
+    ) -> Tuple[Dict[str, Any], Sequence[Dict[str, Any]]]:
+        """Returns the prompt's single system message and the history that follows it.
+
+        The shared instructions come first and the user context second. Any
+        system messages leading the history (e.g. a conversation summary) are
+        folded into the end of the same message, so the prompt has exactly one
+        system message followed by user/assistant turns. An override replaces
+        the instructions and user context.
+        """
+        if system_message_override:
+            content = system_message_override
+        else:
+            content = _format_system_prompt(
+                default_system_prompt, self.user_context_template, name
+            )
+        start = 0
+        while start < len(history) and history[start]["role"] == "system":
+            content = f"{content}\n\n{history[start]['content']}"
+            start += 1
+        return {"role": "system", "content": content}, history[start:]
 
     def build_text_prompt(
         self, 
         name: str, 
         text_body: str, 
-        history: List[Dict[str, Any]], 
+        history: Sequence[Dict[str, Any]], 
         system_message_override: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """Constructs a prompt for a text-only LLM interaction.
@@ -35,28 +79,30 @@ class WhatsAppPromptBuilder:
         Args:
             name (str): The name of the user.
             text_body (str): The user's current text message.
-            history (List[Dict[str, Any]]): A list of previous messages in the conversation.
+            history (Sequence[Dict[str, Any]]): Previous messages in the conversation.
             system_message_override (Optional[str], optional): An overriding system message.
                                                             Defaults to None.
 
         Returns:
             List[Dict[str, Any]]: The list of messages formatted for the LLM.
         """
-        messages = []
-        system_prompt = system_message_override if system_message_override else \
-                        self.default_text_system_prompt_template.format(name=name)
-        
-        messages.append({"role": "system", "content": system_prompt})
-        messages.extend(history) # Add a copy of history
-        messages.append({"role": "user", "content": text_body})
-        return messages
+        system_message, history = self._build_system_message(
+            self.default_text_system_prompt, name, history, system_message_override
+        )
+
+        # Built in a single pass; history is not copied beforehand.
+        return [
+            system_message,
+            *history,
+            {"role": "user", "content": text_body},
+        ]
 
     def build_image_prompt(
         self, 
         name: str, 
         image_data_url: str, 
         caption: Optional[str], 
-        history: List[Dict[str, Any]],
+        history: Sequence[Dict[str, Any]],
         system_message_override: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """Constructs a prompt for a multimodal (image + text) LLM interaction.
@@ -65,29 +111,25 @@ class WhatsAppPromptBuilder:
             name (str): The name of the user.
             image_data_url (str): The data URL of the image (e.g., base64 encoded).
             caption (Optional[str]): The caption for the image, if any.
-            history (List[Dict[str, Any]]): A list of previous messages in the conversation.
+            history (Sequence[Dict[str, Any]]): Previous messages in the conversation.
             system_message_override (Optional[str], optional): An overriding system message.
                                                             Defaults to None.
 
         Returns:
             List[Dict[str, Any]]: The list of messages formatted for the LLM.
         """
-        messages = []
-        system_prompt = system_message_override if system_message_override else \
-                        self.default_image_system_prompt_template.format(name=name)
+        system_message, history = self._build_system_message(
+            self.default_image_system_prompt, name, history, system_message_override
+        )
 
-        messages.append({"role": "system", "content": system_prompt})
-        messages.extend(history) # Add a copy of history
+        caption_text = f" The caption is: '{caption}'." if caption else " There was no caption."
+        user_message_content_parts = [
+            {"type": "text", "text": f"Image received from {name}.{caption_text}"},
+            {"type": "image_url", "image_url": {"url": image_data_url}},
+        ]
 
-        user_message_content_parts = []
-        text_prompt_content = f"Image received from {name}."
-        if caption:
-            text_prompt_content += f" The caption is: '{caption}'."
-        else:
-            text_prompt_content += " There was no caption."
-        
-        user_message_content_parts.append({"type": "text", "text": text_prompt_content})
-        user_message_content_parts.append({"type": "image_url", "image_url": {"url": image_data_url}})
-        
-        messages.append({"role": "user", "content": user_message_content_parts})
-        return messages
+        return [
+            system_message,
+            *history,
+            {"role": "user", "content": user_message_content_parts},
+        ]
@@ -7,31 +7,172 @@ multimodal), and embeddings. It also includes helper methods for interacting
 with the WhatsApp Media API to retrieve image information and content.
 """
 import os
+import json
+import atexit
+import binascii
+import hashlib
+import importlib.util
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 import requests
-from typing import List, Dict, Any, Union, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import List, Dict, Any, Callable, Iterator, Mapping, Tuple, Type, Union, Optional
 
 from flask import current_app
 from openai import OpenAI, AzureOpenAI
-from app.bot.decorators.service_decorators import require_env_vars
+from app.bot.decorators.service_decorators import check_env_vars
+from app.bot.cache import TTLCache
+from app.bot.rate_limit import TokenBucket
+from app.bot.tokens import estimate_prompt_tokens
 
 logger = logging.getLogger(__name__)
 
+# Bounds applied when fitting max_tokens into the model's context window
+MIN_COMPLETION_TOKENS = 64
+CONTEXT_SAFETY_MARGIN = 32
+
+# Environment variables that must be set for each CHAT_API_PROVIDER
+_PROVIDER_REQUIRED_ENV_VARS: Dict[str, Tuple[str, ...]] = {
+    "AZURE": ("AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_API_KEY", "AZURE_OPENAI_DEPLOYMENT_NAME"),
+    "OPENAI": ("OPENAI_API_KEY", "OPENAI_MODEL_NAME"),
+    "VLLM": ("VLLM_API_BASE", "VLLM_MODEL_NAME"),
+}
+
+
+def _validate_provider_env(provider: str) -> None:
+    """Checks once, up front, that the selected provider's environment is complete.
+
+    Raises:
+        ValueError: If the provider is not supported.
+        RuntimeError: If a required environment variable is missing.
+    """
+    required_vars = _PROVIDER_REQUIRED_ENV_VARS.get(provider)
+    if required_vars is None:
+        raise ValueError(
+            f"Invalid CHAT_API_PROVIDER: '{provider}'. "
+            "Supported values are 'OPENAI', 'AZURE', or 'VLLM'."
+        )
+    check_env_vars(provider, required_vars)
+
+# pybase64 uses SIMD base64 kernels and is several times faster than binascii on
+# multi-megabyte images. It is optional; without it the stdlib encoder is used.
+try:
+    from pybase64 import b64encode as _b64encode
+except ImportError:
+    def _b64encode(data) -> bytes:
+        return binascii.b2a_base64(data, newline=False)
+
+# Media is read in chunks that are a multiple of 3 bytes so each one
+# base64-encodes without padding and the outputs can simply be concatenated.
+MEDIA_CHUNK_SIZE = 48 * 1024
+
+# Shared by all LLMProvider instances so Meta media requests reuse keep-alive
+# connections. GETs are idempotent, so gateway errors are retried with backoff.
+_media_session: Optional[requests.Session] = None
+_media_session_lock = threading.Lock()
+
+
+def _get_media_session() -> requests.Session:
+    """Returns the process-wide pooled session used for Meta media requests."""
+    global _media_session
+    if _media_session is None:
+        with _media_session_lock:
+            if _media_session is None:
+                session = requests.Session()
+                retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+                session.mount(
+                    "https://",
+                    HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry),
+                )
+                _media_session = session
+    return _media_session
+
+
+# With the optional h2 package (httpx[http2]) concurrent requests to an HTTPS
+# endpoint are multiplexed over one connection; otherwise HTTP/1.1 is used.
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# A single long-lived httpx client handed to the OpenAI SDK, so its TLS context
+# and connection pool are built once per process and shared by chat and
+# embedding calls instead of being recreated with every SDK client.
+_llm_http_client: Optional[httpx.Client] = None
+_llm_http_client_lock = threading.Lock()
+
+
+def _get_llm_http_client() -> httpx.Client:
+    """Returns the process-wide httpx client used by the OpenAI SDK clients."""
+    global _llm_http_client
+    if _llm_http_client is None:
+        with _llm_http_client_lock:
+            if _llm_http_client is None:
+                _llm_http_client = httpx.Client(
+                    http2=_HTTP2_AVAILABLE,
+                    limits=httpx.Limits(
+                        max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0
+                    ),
+                    timeout=httpx.Timeout(60.0, connect=5.0),
+                )
+                atexit.register(_llm_http_client.close)
+    return _llm_http_client
+
+@dataclass(frozen=True, slots=True)
+class ProviderConfig:
+    """Resolved settings for one CHAT_API_PROVIDER."""
+
+    client_class: Type[Union[OpenAI, AzureOpenAI]]
+    client_config: Dict[str, Any]
+    chat_model_id: str
+    embedding_model_id: str
+
+
 class LLMProvider:
     """Provides an interface to a configured LLM service and media utilities."""
 
     def __init__(self):
-        """Initializes the LLM client, model IDs, and media handling utilities."""
-        self.client: Union[OpenAI, AzureOpenAI]
+        """Initializes the LLM configuration, model IDs, and media handling utilities.
+
+        The provider's environment is validated here so misconfiguration fails
+        at startup, but the SDK client itself is only built on first use.
+        """
+        self.provider_name: str
+        self._provider_config: ProviderConfig
+        self._client: Optional[Union[OpenAI, AzureOpenAI]] = None
+        self._client_lock = threading.Lock()
         self.chat_model_id: str
         self.embedding_model_id: str
+        self._media_session = _get_media_session()
+        # (token, headers) for the last ACCESS_TOKEN seen; replaced as a whole
+        self._media_auth: Tuple[Optional[str], Mapping[str, str]] = (None, MappingProxyType({}))
+        version_str = current_app.config.get("VERSION") or "v19.0"
+        # Ensure 'v' is not duplicated if already present in version_str
+        if not version_str.startswith("v"):
+            version_str = f"v{version_str}"
+        self._graph_api_base_url = f"https://graph.facebook.com/{version_str}"
+        cache_ttl = current_app.config.get("LLM_CACHE_TTL", 3600)
+        # A TTL of 0 disables the completion cache entirely
+        self._completion_cache: Optional[TTLCache] = (
+            TTLCache(maxsize=1024, ttl=cache_ttl) if cache_ttl > 0 else None
+        )
+        # Caps in-flight LLM calls so bursts queue here instead of tripping provider rate limits
+        self._llm_slots = threading.BoundedSemaphore(current_app.config.get("LLM_MAX_CONCURRENCY", 16))
+        rpm_limit = current_app.config.get("LLM_RPM_LIMIT", 0)
+        self._rate_limiter: Optional[TokenBucket] = TokenBucket(rpm_limit) if rpm_limit > 0 else None
+        # 0 means the context window is unknown and max_tokens is used as given
+        self.context_window = current_app.config.get("LLM_CONTEXT_WINDOW", 0)
         self._initialize_llm_client()
-        logger.info(f"LLMProvider initialized for provider: {os.getenv('CHAT_API_PROVIDER', 'OPENAI').upper()}, Model: {self.chat_model_id}")
+        if current_app.config.get("LLM_WARMUP_ON_START", False):
+            threading.Thread(
+                target=self._warm_up_connection, name="llm-warmup", daemon=True
+            ).start()
+        logger.info("LLMProvider initialized for provider: %s, Model: %s", self.provider_name, self.chat_model_id)
 
-    @require_env_vars(provider_name="AZURE", required_vars=[
-        "AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_API_KEY", "AZURE_OPENAI_DEPLOYMENT_NAME"
-    ])
-    def _get_azure_config_internal(self) -> Dict[str, Any]:
+    def _get_azure_config_internal(self) -> ProviderConfig:
         """Retrieves Azure OpenAI specific configurations. Internal use for initialization."""
         endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "").rstrip("/")
         api_key = os.getenv("AZURE_OPENAI_API_KEY")
@@ -40,75 +181,115 @@ class LLMProvider:
         embedding_deployment_name = os.getenv(
             "AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME", chat_deployment_name
         )
-        return {
-            "client_config": {
+        return ProviderConfig(
+            client_class=AzureOpenAI,
+            client_config={
                 "api_key": api_key,
                 "api_version": api_version,
                 "azure_endpoint": endpoint,
+                "http_client": _get_llm_http_client(),
             },
-            "client_class": AzureOpenAI,
-            "chat_model_id": chat_deployment_name,
-            "embedding_model_id": embedding_deployment_name,
-        }
+            chat_model_id=chat_deployment_name,
+            embedding_model_id=embedding_deployment_name,
+        )
 
-    @require_env_vars(provider_name="OPENAI", required_vars=["OPENAI_API_KEY", "OPENAI_MODEL_NAME"])
-    def _get_openai_config_internal(self) -> Dict[str, Any]:
+    def _get_openai_config_internal(self) -> ProviderConfig:
         """Retrieves OpenAI specific configurations. Internal use for initialization."""
         api_key = os.getenv("OPENAI_API_KEY")
         model_name = os.getenv("OPENAI_MODEL_NAME")
         api_base = os.getenv("OPENAI_API_BASE") # optional
         embedding_model_name = os.getenv("OPENAI_EMBEDDING_MODEL_NAME", "text-embedding-3-small")
-        return {
-            "client_config": {
+        return ProviderConfig(
+            client_class=OpenAI,
+            client_config={
                 "api_key": api_key,
                 "base_url": api_base or None,
+                "http_client": _get_llm_http_client(),
             },
-            "client_class": OpenAI,
-            "chat_model_id": model_name,
-            "embedding_model_id": embedding_model_name,
-        }
+            chat_model_id=model_name,
+            embedding_model_id=embedding_model_name,
+        )
 
-    @require_env_vars(provider_name="VLLM", required_vars=["VLLM_API_BASE", "VLLM_MODEL_NAME"])
-    def _get_vllm_config_internal(self) -> Dict[str, Any]:
+    def _get_vllm_config_internal(self) -> ProviderConfig:
         """Retrieves vLLM specific configurations. Internal use for initialization."""
         api_base = os.getenv("VLLM_API_BASE")
         model_name = os.getenv("VLLM_MODEL_NAME")
         api_key = os.getenv("VLLM_API_KEY", "EMPTY")  # Default to "EMPTY" as per vLLM docs
         embedding_model_name = os.getenv("VLLM_EMBEDDING_MODEL_NAME", model_name)
-        return {
-            "client_config": {
+        return ProviderConfig(
+            client_class=OpenAI,  # vLLM is OpenAI-compatible
+            client_config={
                 "base_url": api_base,
                 "api_key": api_key,
+                "http_client": _get_llm_http_client(),
             },
-            "client_class": OpenAI,  # vLLM is OpenAI-compatible
-            "chat_model_id": model_name,
-            "embedding_model_id": embedding_model_name,
-        }
+            chat_model_id=model_name,
+            embedding_model_id=embedding_model_name,
+        )
+
+    # Provider name -> config loader; keys must match _PROVIDER_REQUIRED_ENV_VARS
+    _CONFIG_LOADERS: Dict[str, Callable[["LLMProvider"], ProviderConfig]] = {
+        "AZURE": _get_azure_config_internal,
+        "OPENAI": _get_openai_config_internal,
+        "VLLM": _get_vllm_config_internal,
+    }
 
     def _initialize_llm_client(self):
-        """Initializes the API client and model IDs based on CHAT_API_PROVIDER."""
-        provider = os.getenv("CHAT_API_PROVIDER", "OPENAI").upper()
-        config_data: Optional[Dict[str, Any]] = None
-
-        if provider == "AZURE":
-            config_data = self._get_azure_config_internal()
-        elif provider == "OPENAI":
-            config_data = self._get_openai_config_internal()
-        elif provider == "VLLM":
-            config_data = self._get_vllm_config_internal()
-        else:
-            raise ValueError(
-                f"Invalid CHAT_API_PROVIDER: '{provider}'. "
-                "Supported values are 'OPENAI', 'AZURE', or 'VLLM'."
-            )
-        
-        if not config_data: # Should be caught by decorator or above, but as safeguard
-            raise RuntimeError(f"Configuration could not be loaded for provider: {provider}")
+        """Resolves the client configuration and model IDs based on CHAT_API_PROVIDER."""
+        provider = current_app.config.get("CHAT_API_PROVIDER") or "OPENAI"
+        _validate_provider_env(provider)
+        self.provider_name = provider
+        self._provider_config = self._CONFIG_LOADERS[provider](self)
+        self._max_retries = current_app.config.get("LLM_MAX_RETRIES", 3)
+        self.chat_model_id = self._provider_config.chat_model_id
+        self.embedding_model_id = self._provider_config.embedding_model_id
+
+    @property
+    def client(self) -> Union[OpenAI, AzureOpenAI]:
+        """The SDK client for the configured provider, built on first access."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # The SDK retries connection errors, 408/409/429 and 5xx responses
+                    # with jittered exponential backoff and honours Retry-After.
+                    self._client = self._provider_config.client_class(
+                        **self._provider_config.client_config,
+                        max_retries=self._max_retries,
+                    )
+        return self._client
+
+    @contextmanager
+    def _llm_call_slot(self) -> Iterator[None]:
+        """Waits for the RPM limiter and a concurrency slot before an LLM API call."""
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire()
+        with self._llm_slots:
+            yield
 
-        client_class = config_data["client_class"]
-        self.client = client_class(**config_data["client_config"])
-        self.chat_model_id = config_data["chat_model_id"]
-        self.embedding_model_id = config_data["embedding_model_id"]
+    def _warm_up_connection(self) -> None:
+        """Opens a connection to the LLM API so the first user turn skips the handshake.
+
+        Runs on a background thread at startup. The probe response is discarded
+        and failures are only logged; the pooled connection is what matters.
+        """
+        try:
+            self.client.with_options(timeout=5.0, max_retries=0).models.list()
+            logger.info("LLM API connection warmed up.")
+        except Exception as e:
+            logger.warning("LLM API warm-up request failed (continuing without it): %s", e)
+
+    def _media_headers(self) -> Mapping[str, str]:
+        """Returns the Authorization headers for Meta media requests.
+
+        The token is read per call so a rotated ACCESS_TOKEN takes effect
+        immediately, but the headers mapping is only rebuilt when it changes.
+        """
+        token = current_app.config["ACCESS_TOKEN"]
+        cached_token, headers = self._media_auth
+        if token != cached_token:
+            headers = MappingProxyType({"Authorization": f"Bearer {token}"})
+            self._media_auth = (token, headers)
+        return headers
 
     def get_media_info(self, media_id: str) -> Optional[Dict[str, str]]:
         """Retrieves media item's URL and MIME type using its ID from Meta API.
@@ -120,94 +301,371 @@ class LLMProvider:
             Optional[Dict[str, str]]: A dictionary with "url" and "mime_type"
                                        if successful, None otherwise.
         """
-        version_str = current_app.config.get('VERSION', 'v19.0')
-        # Ensure 'v' is not duplicated if already present in version_str
-        if version_str.startswith('v'):
-            base_api_url = f"https://graph.facebook.com/{version_str}"
-        else:
-            base_api_url = f"https://graph.facebook.com/v{version_str}"
-        
-        url = f"{base_api_url}/{media_id}"
-        headers = {"Authorization": f"Bearer {current_app.config['ACCESS_TOKEN']}"}
+        url = f"{self._graph_api_base_url}/{media_id}"
+        headers = self._media_headers()
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self._media_session.get(url, headers=headers, timeout=10)
             response.raise_for_status()
-            data = response.json()
+            # json.loads detects the UTF encoding of the raw bytes itself, skipping
+            # requests' charset handling and the intermediate str
+            data = json.loads(response.content)
             if "url" in data and "mime_type" in data:
                 return {"url": data["url"], "mime_type": data["mime_type"], "id": data.get("id", media_id)}
             else:
-                logger.error(f"Missing 'url' or 'mime_type' in media info response for ID {media_id}: {data}")
+                logger.error("Missing 'url' or 'mime_type' in media info response for ID %s: %s", media_id, data)
                 return None
         except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to retrieve media info for ID {media_id}: {e}")
+            logger.error("Failed to retrieve media info for ID %s: %s", media_id, e)
             return None
         except ValueError as e: # Includes JSONDecodeError
-            logger.error(f"Failed to decode JSON response for media info ID {media_id}: {e}")
+            logger.error("Failed to decode JSON response for media info ID %s: %s", media_id, e)
             return None
 
-    def download_media_content(self, media_download_url: str) -> Optional[bytes]:
-        """Downloads the media content from the given URL (obtained from Meta API).
+    def download_media_base64(
+        self, media_download_url: str, prefix: bytes = b""
+    ) -> Optional[bytearray]:
+        """Streams media from the given URL and base64-encodes it chunk by chunk.
+
+        The encoded output is appended to a single buffer as the download
+        progresses, so the raw media is never held in memory in full.
 
         Args:
             media_download_url (str): The URL to download the media from.
+            prefix (bytes): Bytes to place before the encoded data, e.g. a
+                data URL header, so callers need no further concatenation.
 
         Returns:
-            Optional[bytes]: The media content as bytes if successful, None otherwise.
+            Optional[bytearray]: prefix followed by the base64-encoded media,
+                or None if the download failed or returned no content.
         """
-        headers = {"Authorization": f"Bearer {current_app.config['ACCESS_TOKEN']}"}
+        headers = self._media_headers()
+        buffer = bytearray(prefix)
+        remainder = b""
         try:
-            response = requests.get(media_download_url, headers=headers, timeout=30)
-            response.raise_for_status()
-            return response.content
+            with self._media_session.get(media_download_url, headers=headers, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=MEDIA_CHUNK_SIZE):
+                    if remainder:
+                        chunk = remainder + chunk
+                    # iter_content may return short chunks; carry any bytes past
+                    # the last multiple of 3 over to the next chunk.
+                    view = memoryview(chunk)
+                    usable = len(view) - len(view) % 3
+                    buffer += _b64encode(view[:usable])
+                    remainder = bytes(view[usable:])
         except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to download media from URL {media_download_url}: {e}")
+            logger.error("Failed to download media from URL %s: %s", media_download_url, e)
             return None
+        buffer += _b64encode(remainder)
+        if len(buffer) == len(prefix):
+            logger.error("Downloaded media from URL %s is empty", media_download_url)
+            return None
+        return buffer
+
+    def _fit_max_tokens(self, messages: List[Dict[str, Any]], max_tokens: int) -> int:
+        """Shrinks max_tokens so the prompt plus completion fit the context window.
+
+        A smaller max_tokens also lowers latency, since the server reserves
+        space for the full completion budget up front.
+
+        Args:
+            messages (List[Dict[str, Any]]): The prompt that will be sent.
+            max_tokens (int): The requested completion budget.
+
+        Returns:
+            int: max_tokens, reduced if needed but never below MIN_COMPLETION_TOKENS.
+        """
+        if not self.context_window:
+            return max_tokens
+        available = self.context_window - estimate_prompt_tokens(messages) - CONTEXT_SAFETY_MARGIN
+        return max(MIN_COMPLETION_TOKENS, min(max_tokens, available))
+
+    def _completion_cache_key(
+        self, messages: List[Dict[str, Any]], temperature: float, max_tokens: int
+    ) -> str:
+        """Builds a cache key covering the full prompt and generation parameters."""
+        canonical = json.dumps(messages, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+        return f"{digest}|{self.chat_model_id}|{temperature}|{max_tokens}"
 
     def get_chat_completion(
         self, 
         messages: List[Dict[str, Any]], 
         temperature: float = 0.7, 
-        max_tokens: int = 512
-    ) -> str:
+        max_tokens: int = 512,
+        use_cache: Optional[bool] = None,
+    ) -> Optional[str]:
         """Gets a chat completion from the configured LLM.
 
+        Successful completions can be cached by an exact hash of the messages
+        and generation parameters, so an identical request is answered without
+        calling the API again. Since sampled replies vary, caching is only on
+        by default for deterministic (temperature 0) requests.
+
         Args:
             messages (List[Dict[str, Any]]): A list of message objects, prepared
                 by PromptBuilder, suitable for the OpenAI API (can be multimodal).
             temperature (float): Sampling temperature for the completion.
             max_tokens (int): Maximum number of tokens to generate.
+            use_cache (Optional[bool]): Whether to read from and write to the
+                completion cache. None caches only when temperature is 0.
 
         Returns:
-            str: The assistant's response text, or a generic error message.
+            Optional[str]: The assistant's response text, or None if the call
+                failed or the response was empty, so callers can apologize
+                instead of treating an error as a reply.
         """
+        max_tokens = self._fit_max_tokens(messages, max_tokens)
+        if use_cache is None:
+            use_cache = temperature == 0
+        cache_key = None
+        if use_cache and self._completion_cache is not None:
+            cache_key = self._completion_cache_key(messages, temperature, max_tokens)
+        if cache_key:
+            cached_text = self._completion_cache.get(cache_key)
+            if cached_text is not None:
+                logger.info("Returning cached chat completion.")
+                return cached_text
+
         try:
-            response = self.client.chat.completions.create(
-                model=self.chat_model_id,
-                messages=messages, # type: ignore # complesso per type checker statico
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
+            with self._llm_call_slot():
+                response = self.client.chat.completions.create(
+                    model=self.chat_model_id,
+                    messages=messages, # type: ignore # complesso per type checker statico
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                )
             assistant_text = response.choices[0].message.content if response.choices[0].message.content else ""
-            return assistant_text.strip() if assistant_text else "I received that, but I'm not sure how to respond just yet."
+            assistant_text = assistant_text.strip()
+            if logger.isEnabledFor(logging.DEBUG) and response.usage:
+                # Shows whether the provider's prefix prompt cache is being hit
+                prompt_details = getattr(response.usage, "prompt_tokens_details", None)
+                logger.debug(
+                    "Chat completion usage: prompt_tokens=%s, cached_tokens=%s",
+                    response.usage.prompt_tokens,
+                    getattr(prompt_details, "cached_tokens", None),
+                )
         except Exception as e:
-            logger.error(f"Error calling LLM for chat completion: {e}")
-            return "I encountered an issue trying to process your request. Please try again."
+            logger.error("Error calling LLM for chat completion: %s", e)
+            return None
+
+        if not assistant_text:
+            logger.warning("LLM returned an empty chat completion.")
+            return None
+        if cache_key:
+            self._completion_cache.set(cache_key, assistant_text)
+        return assistant_text
+
+    def get_finished_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float = 0,
+        max_tokens: int = 512,
+    ) -> Optional[str]:
+        """Gets a chat completion only if the model finished it normally.
+
+        For internal tasks such as history summaries, where a fallback message
+        or a reply cut off at max_tokens must never be used as if it were
+        complete. Results are not cached.
+
+        Args:
+            messages (List[Dict[str, Any]]): A list of message objects suitable
+                for the OpenAI API.
+            temperature (float): Sampling temperature for the completion.
+            max_tokens (int): Maximum number of tokens to generate.
+
+        Returns:
+            Optional[str]: The response text, or None if the call failed, the
+                response was empty, or generation stopped for any reason other
+                than a natural end ("stop").
+        """
+        max_tokens = self._fit_max_tokens(messages, max_tokens)
+        try:
+            with self._llm_call_slot():
+                response = self.client.chat.completions.create(
+                    model=self.chat_model_id,
+                    messages=messages, # type: ignore
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                )
+        except Exception as e:
+            logger.error("Error calling LLM for chat completion: %s", e)
+            return None
+        choice = response.choices[0]
+        text = (choice.message.content or "").strip()
+        if choice.finish_reason != "stop" or not text:
+            logger.warning(
+                "Discarding unfinished chat completion (finish_reason=%s, %s chars).",
+                choice.finish_reason, len(text),
+            )
+            return None
+        return text
+
+    def stream_chat_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float = 0.7,
+        max_tokens: int = 512,
+    ) -> Iterator[str]:
+        """Streams a chat completion from the configured LLM as it is generated.
+
+        Unlike get_chat_completion, text is yielded as soon as the first tokens
+        arrive, so callers can start replying before generation finishes.
+        Streamed completions are not cached.
+
+        Args:
+            messages (List[Dict[str, Any]]): A list of message objects, prepared
+                by PromptBuilder, suitable for the OpenAI API (can be multimodal).
+            temperature (float): Sampling temperature for the completion.
+            max_tokens (int): Maximum number of tokens to generate.
+
+        Yields:
+            str: Successive fragments of the assistant's response text.
+
+        Raises:
+            Exception: If the request fails or the stream breaks off, so callers
+                can tell a complete reply from a truncated one.
+        """
+        max_tokens = self._fit_max_tokens(messages, max_tokens)
+        try:
+            # The slot is held until the stream is exhausted or closed
+            with self._llm_call_slot():
+                stream = self.client.chat.completions.create(
+                    model=self.chat_model_id,
+                    messages=messages, # type: ignore
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                )
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+        except Exception as e:
+            logger.error("Error streaming chat completion from LLM: %s", e)
+            raise
 
     def get_embedding(self, text: str) -> Optional[List[float]]:
         """Generates an embedding vector for the given text.
 
+        This is a single-input convenience wrapper around get_embeddings.
+
         Args:
             text (str): The text to embed.
 
         Returns:
             Optional[List[float]]: The embedding vector, or None on error.
         """
+        embeddings = self.get_embeddings([text])
+        return embeddings[0] if embeddings else None
+
+    def get_embeddings(
+        self, texts: List[str], batch_size: int = 512, max_concurrency: int = 8
+    ) -> Optional[List[List[float]]]:
+        """Generates embedding vectors for many texts using batched requests.
+
+        Texts are sent in batches of up to batch_size inputs per API call, and
+        up to max_concurrency batches are in flight at once over the shared
+        connection pool.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            batch_size (int): Maximum number of inputs per embeddings request.
+            max_concurrency (int): Maximum number of concurrent requests.
+
+        Returns:
+            Optional[List[List[float]]]: One embedding per input text, in input
+                order, or None if any request failed.
+        """
+        if not texts:
+            return []
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+        def embed_batch(batch: List[str]) -> List[List[float]]:
+            with self._llm_call_slot():
+                resp = self.client.embeddings.create(model=self.embedding_model_id, input=batch)
+            return [item.embedding for item in sorted(resp.data, key=lambda item: item.index)]
+
         try:
-            resp = self.client.embeddings.create(
-                model=self.embedding_model_id, 
-                input=[text]
+            if len(batches) == 1:
+                results = [embed_batch(batches[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as executor:
+                    results = list(executor.map(embed_batch, batches))
+        except Exception as e:
+            logger.error("Error calling LLM for batched embeddings: %s", e)
+            return None
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+    def submit_batch(
+        self, batch_requests: List[Dict[str, Any]], endpoint: str = "/v1/chat/completions"
+    ) -> Optional[str]:
+        """Submits requests to the Batch API for asynchronous, discounted processing.
+
+        Intended for work that can tolerate up to 24 hours of latency, such as
+        offline summaries or backfilling embeddings, not for live replies.
+
+        Args:
+            batch_requests (List[Dict[str, Any]]): Batch request lines, each with a
+                unique "custom_id" and a "body" holding the API parameters.
+                "method" and "url" default to POST and endpoint, and the body's
+                "model" defaults to the configured model for the endpoint.
+            endpoint (str): The API endpoint the batch targets.
+
+        Returns:
+            Optional[str]: The batch job ID, or None on error.
+        """
+        default_model = (
+            self.embedding_model_id if endpoint.endswith("/embeddings") else self.chat_model_id
+        )
+        lines = []
+        for request_line in batch_requests:
+            body = request_line["body"]
+            if "model" not in body:
+                body = {**body, "model": default_model}
+            lines.append(json.dumps(
+                {"method": "POST", "url": endpoint, **request_line, "body": body},
+                separators=(",", ":"),
+                ensure_ascii=False,
+            ))
+        try:
+            batch_file = self.client.files.create(
+                file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch"
+            )
+            job = self.client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint=endpoint, # type: ignore
+                completion_window="24h",
             )
-            return resp.data[0].embedding
         except Exception as e:
-            logger.error(f"Error calling LLM for embedding: {e}")
+            logger.error("Error submitting batch of %s requests: %s", len(lines), e)
+            return None
+        logger.info("Submitted batch %s with %s requests.", job.id, len(lines))
+        return job.id
+
+    def poll_batch(self, job_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Returns the results of a batch job once it has completed.
+
+        Args:
+            job_id (str): The ID returned by submit_batch.
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: The parsed output lines (each with its
+                "custom_id" and "response"), or None if the job is still running,
+                did not succeed, or could not be fetched.
+        """
+        try:
+            job = self.client.batches.retrieve(job_id)
+            if job.status != "completed":
+                if job.status in ("failed", "expired", "cancelled"):
+                    logger.warning("Batch %s ended with status '%s'.", job_id, job.status)
+                return None
+            if not job.output_file_id:
+                return []
+            output = self.client.files.content(job.output_file_id)
+            return [json.loads(line) for line in output.text.splitlines() if line]
+        except Exception as e:
+            logger.error("Error polling batch %s: %s", job_id, e)
             return None
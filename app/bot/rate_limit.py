@@ -0,0 +1,40 @@
+"""Request rate limiting for outbound API calls.
+
+This module provides TokenBucket, a small thread-safe token-bucket limiter
+used to keep LLM requests under a provider's requests-per-minute quota.
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket; each request takes one token."""
+
+    def __init__(self, rate_per_minute: float, burst: int = 0):
+        """Initializes a full bucket.
+
+        Args:
+            rate_per_minute (float): Sustained number of requests allowed per minute.
+            burst (int): Maximum tokens the bucket can hold. Defaults to one
+                second's worth of requests (at least 1).
+        """
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(self.rate_per_second)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Takes one token, sleeping until one is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate_per_second
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate_per_second
+            time.sleep(wait)
@@ -0,0 +1,93 @@
+"""Per-key serial task execution on a shared thread pool.
+
+This module provides KeyedSerialExecutor, which runs tasks submitted under
+the same key (a WhatsApp ID) one at a time and in submission order, while
+tasks for different keys run concurrently on a bounded worker pool.
+"""
+import functools
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Optional
+
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedSerialExecutor:
+    """FIFO queue per key with at most one task in flight for each key.
+
+    No lock is held while a task runs, so a slow task (e.g. an LLM call)
+    only delays later tasks for the same key. Once a task finishes, the next
+    one for its key is resubmitted to the pool instead of running inline, so
+    a busy user cannot hold a worker thread while others wait.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = "", app: Optional[Flask] = None):
+        """Initializes the executor. Worker threads are started on demand.
+
+        Args:
+            max_workers (int): Size of the shared worker pool.
+            thread_name_prefix (str): Prefix for worker thread names.
+            app (Optional[Flask]): If given, every task runs inside its app context.
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=thread_name_prefix
+        )
+        self._app = app
+        # key -> tasks waiting behind the one in flight; a key is present
+        # exactly while one of its tasks is queued on or running in the pool.
+        self._queues: Dict[Hashable, Deque[Callable[[], Any]]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> None:
+        """Queues fn(*args) to run after every task already submitted for key.
+
+        Args:
+            key (Hashable): The ordering key, e.g. a WhatsApp ID.
+            fn (Callable[..., Any]): The task to run.
+            *args (Any): Positional arguments for fn.
+        """
+        task = functools.partial(fn, *args)
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.append(task)
+                return
+            self._queues[key] = deque()
+        self._dispatch(key, task)
+
+    def _dispatch(self, key: Hashable, task: Callable[[], Any]) -> None:
+        """Hands a task to the pool, or runs it inline once the pool has shut down.
+
+        At interpreter exit the pool stops accepting work before atexit
+        handlers run, so work flushed from those handlers still completes.
+        """
+        try:
+            self._executor.submit(self._run, key, task)
+        except RuntimeError:
+            self._run(key, task)
+
+    def _run(self, key: Hashable, task: Callable[[], Any]) -> None:
+        """Runs one task for key, then hands the key's next task to the pool."""
+        try:
+            if self._app is not None:
+                with self._app.app_context():
+                    task()
+            else:
+                task()
+        except Exception:
+            logger.exception("Unhandled error in queued task for %s.", key)
+        with self._lock:
+            queue = self._queues[key]
+            if not queue:
+                del self._queues[key]
+                return
+            next_task = queue.popleft()
+        self._dispatch(key, next_task)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops accepting work and optionally waits for running tasks."""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,38 @@
+"""Lightweight prompt token estimation.
+
+This module estimates how many tokens chat messages will use without a
+model-specific tokenizer, which is enough for budgeting history and
+sizing max_tokens. Estimates use the common ~4 characters per token rule.
+"""
+from typing import Any, Dict, Iterable, List, Union
+
+MessageContent = Union[str, List[Dict[str, Any]]]
+
+# Rough per-message overhead of the chat format (role, separators)
+_MESSAGE_TOKEN_OVERHEAD = 4
+# Flat estimate for a non-text content part such as an image
+_NON_TEXT_PART_TOKENS = 85
+
+
+def estimate_tokens(content: MessageContent) -> int:
+    """Estimates the prompt tokens used by one message's content.
+
+    Args:
+        content (MessageContent): A message's content, either a string or a
+            list of multimodal content parts.
+
+    Returns:
+        int: The estimated token count, including per-message overhead.
+    """
+    if isinstance(content, str):
+        return len(content) // 4 + _MESSAGE_TOKEN_OVERHEAD
+    tokens = _MESSAGE_TOKEN_OVERHEAD
+    for part in content:
+        text = part.get("text")
+        tokens += len(text) // 4 if isinstance(text, str) else _NON_TEXT_PART_TOKENS
+    return tokens
+
+
+def estimate_prompt_tokens(messages: Iterable[Dict[str, Any]]) -> int:
+    """Estimates the total prompt tokens of a list of chat messages."""
+    return sum(estimate_tokens(message.get("content") or "") for message in messages)
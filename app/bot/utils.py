@@ -1,84 +1,140 @@
 """Bot-specific utility functions for WhatsApp message processing."""
 import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import current_app
 
 from .assistant import ChatAssistant
+from .serial import KeyedSerialExecutor
 
 logger = logging.getLogger(__name__)
 
-def process_whatsapp_message(body):
-    """Processes an incoming WhatsApp message payload and delegates to ChatAssistant."""
-    try:
-        value = body["entry"][0]["changes"][0]["value"]
-        if not value.get("contacts") or not value.get("messages"):
-            logger.warning("Webhook received without contacts or messages key in value.")
-            return # Not a user message we can process
-
-        wa_id = value["contacts"][0]["wa_id"]
-        name = value["contacts"][0]["profile"]["name"]
-        message_object = value["messages"][0]
-        message_type = message_object["type"]
-    except (IndexError, KeyError) as e:
-        logger.error(f"Error parsing essential fields from webhook body: {e}. Body: {body}")
+
+@dataclass(slots=True)
+class ParsedMessage:
+    """The sender and message object extracted from a webhook payload."""
+
+    wa_id: str
+    name: str
+    message: Dict[str, Any]
+
+
+def dispatch_whatsapp_message(parsed: ParsedMessage) -> None:
+    """Queues a parsed webhook message for background processing.
+
+    The LLM call and the outgoing Graph API send can take several seconds, so
+    they run on a worker pool. The webhook can acknowledge Meta immediately and
+    concurrent users no longer block each other on the request thread.
+    Messages from the same user are queued behind each other and handled one
+    at a time, in the order they arrived.
+    """
+    message_executor: KeyedSerialExecutor = current_app.extensions["message_executor"]
+    message_executor.submit(parsed.wa_id, process_whatsapp_message, parsed)
+
+
+def _handle_text(chat_assistant: ChatAssistant, parsed: ParsedMessage) -> None:
+    """Hands a text message to the ChatAssistant."""
+    wa_id, name = parsed.wa_id, parsed.name
+    message_body = parsed.message.get("text", {}).get("body")
+    if not message_body:
+        logger.warning("Text message from %s (%s) has no body.", name, wa_id)
         return
+    logger.info("Handing off text message to ChatAssistant for %s (%s): '%s'", name, wa_id, message_body)
+    chat_assistant.receive_text_message(wa_id, name, message_body)
 
-    chat_assistant = ChatAssistant() 
-
-    match message_type:
-        case "text":
-            message_body = message_object.get("text", {}).get("body")
-            if not message_body:
-                logger.warning(f"Text message from {name} ({wa_id}) has no body.")
-                return
-            logger.info(f"Handing off text message to ChatAssistant for {name} ({wa_id}): '{message_body}'")
-            chat_assistant.handle_text_message(wa_id, name, message_body)
-        case "image":
-            image_object = message_object.get("image", {})
-            image_id = image_object.get("id")
-            if not image_id:
-                logger.warning(f"Image message from {name} ({wa_id}) has no id.")
-                return
-            caption = image_object.get("caption")
-            log_message = f"Handing off image message to ChatAssistant for {name} ({wa_id}), image_id: {image_id}"
-            if caption:
-                log_message += f" with caption: '{caption}'"
-            logger.info(log_message)
-            chat_assistant.handle_image_message(wa_id, name, image_id, caption)
-        case _:
-            logger.warning(
-                f"Received unsupported message type '{message_type}' from {name} ({wa_id})."
-            )
-            # Potentially call a generic handler on chat_assistant if one is added in the future
-            # e.g., chat_assistant.handle_unsupported_message(wa_id, name, message_type)
-            pass
-
-def is_valid_whatsapp_message(body):
-    """Check if the incoming webhook event has a valid WhatsApp message structure."""
-    if not isinstance(body, dict):
-        return False
-    if not body.get("object") == "whatsapp_business_account":
-        return False # Not from a WhatsApp business account
-    
-    entries = body.get("entry")
-    if not isinstance(entries, list) or not entries:
-        return False
-    
-    changes = entries[0].get("changes")
-    if not isinstance(changes, list) or not changes:
-        return False
 
-    value = changes[0].get("value")
-    if not isinstance(value, dict):
-        return False
+def _handle_image(chat_assistant: ChatAssistant, parsed: ParsedMessage) -> None:
+    """Hands an image message, and its caption if any, to the ChatAssistant."""
+    wa_id, name = parsed.wa_id, parsed.name
+    image_object = parsed.message.get("image", {})
+    image_id = image_object.get("id")
+    if not image_id:
+        logger.warning("Image message from %s (%s) has no id.", name, wa_id)
+        return
+    caption = image_object.get("caption")
+    logger.info(
+        "Handing off image message to ChatAssistant for %s (%s), image_id: %s%s",
+        name, wa_id, image_id, f" with caption: '{caption}'" if caption else "",
+    )
+    chat_assistant.receive_image_message(wa_id, name, image_id, caption)
 
-    # Check for actual messages, not status updates etc.
-    if "messages" not in value or not isinstance(value["messages"], list) or not value["messages"]:
-        return False 
-    if "contacts" not in value or not isinstance(value["contacts"], list) or not value["contacts"]:
-        return False
-        
-    # Further check if the first message has a type
-    first_message = value["messages"][0]
-    if not isinstance(first_message, dict) or "type" not in first_message:
+
+def _handle_unsupported(chat_assistant: ChatAssistant, parsed: ParsedMessage) -> None:
+    """Logs a message type the bot does not handle."""
+    logger.warning(
+        "Received unsupported message type '%s' from %s (%s).",
+        parsed.message["type"], parsed.name, parsed.wa_id,
+    )
+    # Potentially call a generic handler on chat_assistant if one is added in the future
+    # e.g., chat_assistant.handle_unsupported_message(wa_id, name, message_type)
+
+
+# WhatsApp message type -> handler; new types are supported by adding an entry
+_MESSAGE_HANDLERS: Dict[str, Callable[[ChatAssistant, ParsedMessage], None]] = {
+    "text": _handle_text,
+    "image": _handle_image,
+}
+
+
+def process_whatsapp_message(parsed: ParsedMessage):
+    """Processes a parsed WhatsApp message and delegates to the app's ChatAssistant."""
+    chat_assistant: ChatAssistant = current_app.extensions["chat_assistant"]
+    handler = _MESSAGE_HANDLERS.get(parsed.message["type"], _handle_unsupported)
+    handler(chat_assistant, parsed)
+
+
+def is_status_update(body) -> bool:
+    """Returns True if the webhook payload is a delivery/read status callback.
+
+    Status callbacks outnumber user messages several to one, so the common
+    path is a single lookup chain with no intermediate defaults.
+    """
+    try:
+        return bool(body["entry"][0]["changes"][0]["value"]["statuses"])
+    except (KeyError, IndexError, TypeError):
         return False
-        
-    return True
+
+
+def parse_webhook(body) -> List[ParsedMessage]:
+    """Validates a webhook payload and extracts every message it carries.
+
+    Meta may batch several messages (and several entries/changes) into one
+    delivery. Returning all of them lets the caller fan them out to the worker
+    pool so their LLM round-trips overlap instead of dropping all but the first.
+
+    Args:
+        body: The decoded JSON body of the webhook request.
+
+    Returns:
+        List[ParsedMessage]: The sender and message for each user message, in
+                             payload order. Empty if the payload is not a
+                             WhatsApp user message (e.g. a status update).
+    """
+    parsed_messages: List[ParsedMessage] = []
+    try:
+        if body["object"] != "whatsapp_business_account":
+            return parsed_messages
+        for entry in body["entry"]:
+            for change in entry.get("changes", ()):
+                value = change.get("value", {})
+                # wa_id -> profile name, in payload order
+                names = {
+                    contact["wa_id"]: contact.get("profile", {}).get("name", "")
+                    for contact in value.get("contacts") or ()
+                    if isinstance(contact, dict) and contact.get("wa_id")
+                }
+                for message in value.get("messages", ()):
+                    if not isinstance(message, dict) or "type" not in message:
+                        continue
+                    wa_id = message.get("from") or next(iter(names), None)
+                    if not wa_id:
+                        # Only this message is unusable; keep parsing the rest
+                        logger.warning("Skipping webhook message %s with no sender.", message.get("id"))
+                        continue
+                    # Without a profile name, address the user by their number
+                    name = names.get(wa_id) or wa_id
+                    parsed_messages.append(ParsedMessage(wa_id=wa_id, name=name, message=message))
+    except (KeyError, IndexError, TypeError, AttributeError):
+        logger.warning("Skipping malformed part of webhook payload.")
+    return parsed_messages
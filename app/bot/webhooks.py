@@ -5,8 +5,9 @@ from flask import Blueprint, current_app, jsonify, request
 
 from .decorators.security import signature_required
 from .utils import (
-    is_valid_whatsapp_message,
-    process_whatsapp_message,
+    dispatch_whatsapp_message,
+    is_status_update,
+    parse_webhook,
 )
 
 webhook_blueprint = Blueprint("webhook", __name__)
@@ -17,8 +18,8 @@ def handle_message():
     Handle incoming webhook events from the WhatsApp API.
 
     This function processes incoming WhatsApp messages and other events,
-    such as delivery statuses. If the event is a valid message, it gets
-    processed. If the incoming payload is not a recognized WhatsApp event,
+    such as delivery statuses. Every message in a valid event is queued for
+    background processing, so batched messages are handled concurrently. If the incoming payload is not a recognized WhatsApp event,
     an error is returned.
 
     Every message send will trigger 4 HTTP requests to your webhook: message, sent, delivered, read.
@@ -27,21 +28,19 @@ def handle_message():
         response: A tuple containing a JSON response and an HTTP status code.
     """
     body = request.get_json()
-    logging.info(f"request body: {body}")
+    # Full bodies arrive for every status callback too, so only log them at DEBUG
+    logging.debug("request body: %s", body)
 
     # Check if it's a WhatsApp status update
-    if (
-        body.get("entry", [{}])[0]
-        .get("changes", [{}])[0]
-        .get("value", {})
-        .get("statuses")
-    ):
+    if is_status_update(body):
         logging.info("Received a WhatsApp status update.")
         return jsonify({"status": "ok"}), 200
 
     try:
-        if is_valid_whatsapp_message(body):
-            process_whatsapp_message(body)
+        parsed_messages = parse_webhook(body)
+        if parsed_messages:
+            for parsed in parsed_messages:
+                dispatch_whatsapp_message(parsed)
             return jsonify({"status": "ok"}), 200
         else:
             # if the request is not a WhatsApp API event, return an error
@@ -1,7 +1,10 @@
 import sys
 import os
+import atexit
+import queue
 from dotenv import load_dotenv
 import logging
+from logging.handlers import QueueHandler, QueueListener
 
 load_dotenv()
 
@@ -14,11 +17,54 @@ def load_configurations(app):
     app.config["VERSION"] = os.getenv("VERSION")
     app.config["PHONE_NUMBER_ID"] = os.getenv("PHONE_NUMBER_ID")
     app.config["VERIFY_TOKEN"] = os.getenv("VERIFY_TOKEN")
+    app.config["WEBHOOK_WORKER_THREADS"] = int(os.getenv("WEBHOOK_WORKER_THREADS", "8"))
+    app.config["STREAM_REPLIES"] = os.getenv("STREAM_REPLIES", "false").lower() == "true"
+    app.config["INBOUND_DEBOUNCE_SECONDS"] = float(os.getenv("INBOUND_DEBOUNCE_SECONDS", "0"))
+    app.config["REPLY_DEBOUNCE_SECONDS"] = float(os.getenv("REPLY_DEBOUNCE_SECONDS", "0"))
+    app.config["CHAT_API_PROVIDER"] = os.getenv("CHAT_API_PROVIDER", "OPENAI").upper()
+    app.config["LLM_MAX_CONCURRENCY"] = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    if app.config["LLM_MAX_CONCURRENCY"] < 1:
+        # A zero-size semaphore would block every LLM call forever
+        raise ValueError(
+            f"LLM_MAX_CONCURRENCY must be at least 1, got {app.config['LLM_MAX_CONCURRENCY']}."
+        )
+    app.config["LLM_RPM_LIMIT"] = float(os.getenv("LLM_RPM_LIMIT", "0"))
+    app.config["LLM_MAX_RETRIES"] = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    app.config["LLM_WARMUP_ON_START"] = os.getenv("LLM_WARMUP_ON_START", "false").lower() == "true"
+    app.config["LLM_CONTEXT_WINDOW"] = int(os.getenv("LLM_CONTEXT_WINDOW", "0"))
+    app.config["LLM_CACHE_TTL"] = float(os.getenv("LLM_CACHE_TTL", "3600"))
+    app.config["HISTORY_TOKEN_BUDGET"] = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+    app.config["CONV_MEMORY_BACKEND"] = os.getenv("CONV_MEMORY_BACKEND", "memory").lower()
+    app.config["REDIS_URL"] = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    app.config["HISTORY_SUMMARY_ENABLED"] = os.getenv("HISTORY_SUMMARY_ENABLED", "false").lower() == "true"
+    app.config["CONV_HISTORY_MAX_USERS"] = int(os.getenv("CONV_HISTORY_MAX_USERS", "10000"))
+    app.config["CONV_HISTORY_IDLE_TTL"] = float(os.getenv("CONV_HISTORY_IDLE_TTL", "3600"))
+
+
+_log_listener = None
 
 
 def configure_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        stream=sys.stdout,
+    """Configures logging so that stream I/O happens off the request threads.
+
+    Loggers enqueue records via a QueueHandler, which still merges each
+    message with its args on the logging thread; a background QueueListener
+    owns the actual stdout handler and writes the records out.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     )
+    queue_handler = QueueHandler(log_queue)
+    # The full format is applied by stream_handler; the queue handler only merges args.
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+
+    _log_listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)